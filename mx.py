@@ -0,0 +1,103 @@
+# ****************************************************************************
+# * mx.py
+# * Single entry point for all Mobotix tools
+#
+# usage:
+# python mx.py <command> [options]
+#   api      = mxapi.py       mic     = mxmic.py
+#   pgm      = mxpgm.py       backup  = mxbackup.py
+#   restore  = mxrestore.py   tract   = mxtract.py
+#   drift    = mxdrift.py     daemon  = mxdaemon.py
+#   replace  = mxreplace.py   snap    = mxsnap.py
+#   census   = mxcensus.py    merge   = mxmerge.py
+#   bench    = measure the startup time of the commands
+# use python mx.py <command> -h for the options of a command
+# Only the tool of the command given is imported and requests is only
+# imported by tools when they actually contact a camera, so commands
+# working on local files like tract or pgm -v start fast.
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import sys
+import time
+import importlib
+import subprocess
+
+RELEASE = '1.0 - 19-10-2026'
+COMMANDS = {
+    'api': 'mxapi',
+    'mic': 'mxmic',
+    'pgm': 'mxpgm',
+    'backup': 'mxbackup',
+    'restore': 'mxrestore',
+    'tract': 'mxtract',
+    'drift': 'mxdrift',
+    'daemon': 'mxdaemon',
+    'replace': 'mxreplace',
+    'snap': 'mxsnap',
+    'census': 'mxcensus',
+    'merge': 'mxmerge',
+}
+BENCH_RUNS = 10
+
+
+def usage():
+    print('MxTools ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('usage: python mx.py <command> [options]')
+    print('commands: ' + ', '.join(COMMANDS) + ', bench')
+    print('use python mx.py <command> -h for the options of a command')
+    print('use python mx.py bench [runs] [command ...] to measure startup time')
+
+
+def startup_time(args, runs):
+    # average and fastest wall clock time in ms of starting a python process
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(1000 * (time.perf_counter() - start))
+    return sum(times) / len(times), min(times)
+
+
+def bench(argv):
+    # starts every command with -h a number of times and compares it to
+    # the startup time of the bare interpreter
+    runs = BENCH_RUNS
+    if argv and argv[0].isdigit():
+        runs = int(argv[0])
+        argv = argv[1:]
+    commands = argv or list(COMMANDS)
+    for command in commands:
+        if command not in COMMANDS:
+            print("Unknown command '%s'" % (command))
+            sys.exit()
+    print('Startup time over %d runs (average / fastest):' % (runs))
+    (average, fastest) = startup_time(['-c', 'pass'], runs)
+    print('%-10s %7.1f ms / %7.1f ms' % ('python', average, fastest))
+    for command in commands:
+        (average, fastest) = startup_time([__file__, command, '-h'], runs)
+        print('%-10s %7.1f ms / %7.1f ms' % (command, average, fastest))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] in ('-h', '--help'):
+        usage()
+        return
+    command = argv[0]
+    if command == 'bench':
+        bench(argv[1:])
+        return
+    if command not in COMMANDS:
+        print("Unknown command '%s'" % (command))
+        usage()
+        sys.exit()
+    sys.argv[0] = COMMANDS[command] + '.py'  # shown by argparse usage
+    importlib.import_module(COMMANDS[command]).main(argv[1:])
+
+
+if __name__ == '__main__':
+    main()
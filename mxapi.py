@@ -2,141 +2,247 @@
 # * mxapi.py
 # * Mobotix api sender
 #
-# This script sends http api comands to (multiple) mobotix camera's 
+# This script sends http api comands to (multiple) mobotix camera's
 # usage:
-# python mxapi.py [options] 
+# python mxapi.py [options]
 # use option -h or --help for instructions
+# Commands can also be sent from other python code:
+#   import mxapi
+#   records = mxapi.send_commands(['192.168.1.24'], ['IP'],
+#                                 ['/control/rcontrol?...'], 'admin', 'meinsm')
 #
 # release info
 # 1.0 first release 140520 Paul Merkx
+# 1.1 multiple commands per device over one connection, {LABEL} parameters
+#     from the devicelist and camera's handled concurrently
+#     -o option to stream status, latency and response of every command
+#     to a JSONL or CSV file, commands available as importable function
 # ****************************************************************************
 import os
-import requests
 import sys
 import argparse
 import csv
 import io
+import re
+import time
+import mxnet
 
-RELEASE = '1.0 - 14 may 2020'
+RELEASE = '1.1 - 19-10-2026'
 TIMEOUT = 3   # requests timeout
+FIELDNAMES = ['IP', 'command', 'status', 'latency_ms', 'result', 'error']
 
-        
-def validate_ip(s):
-    a = s.split('.')
-    if len(a) != 4:
-        return False
-    for x in a:
-        if not x.isdigit():
-            return False
-        i = int(x)
-        if i < 0 or i > 255:
-            return False
-    return True
-
-
-# ***************************************************************
-# *** Main program ***
-# ***************************************************************
-print('MxProgram ' + RELEASE + ' by (c) Simac Healthcare.')
-print('Disclaimer: ')
-print('USE THIS SOFTWARE AT YOUR OWN RISK')
-print(' ')
-
-# *** Read arguments passed on commandline
-parser = argparse.ArgumentParser()
-parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target device IP when programming a single camera")
-parser.add_argument("-l", "--devicelist", nargs=1, help="specify target device list in CSV when programming multiple camera's")
-parser.add_argument("-a", "--apicommand", nargs=1, help="specify api command to send to camera(s).")
-parser.add_argument("-u", "--username", nargs=1, help="specify target device admin username")
-parser.add_argument("-p", "--password", nargs=1, help="specify target device admin password")
-parser.add_argument("-s", "--ssl", help="use SSL to communicate (HTTPS)", action="store_true")
-parser.add_argument("-t", "--timeout", nargs=1, help="specify cUrl timeout in seconds (default = 60)")
-
-args = parser.parse_args()
-
-# *** Check validity of the arguments
-if (args.deviceIP is None and args.devicelist is None) or (args.deviceIP and args.devicelist):
-    print("Either deviceIP or devicelist is required")
-    sys.exit() 
-
-if args.username is None:
-    print("Default Admin account assumed")
-    username = 'admin'
-else:
-    username = args.username[0]
- 
-if args.password is None:
-    print("Default Admin password assumed")
-    password = 'meinsm'
-else:
-    password = args.password[0]
-
-if args.timeout:
-    try:
-        TIMEOUT = int(args.timeout[0])
-    except:
-        print("Unable to understand timeout value of " + args.timeout[0])
-        print("Try an interger")
-        sys.exit()
-        
-if args.deviceIP:
-    if not validate_ip(args.deviceIP[0]):
-        print("The device %s is not a valid IPv4 address!" % (args.deviceIP[0]))
-        sys.exit()
 
-if args.devicelist:
-    if not os.path.exists(args.devicelist[0]):
-        print("The devicelist '%s' does not exist in the current directory!" % (args.devicelist[0]))
-        sys.exit()
+def read_apifile(apifile):
+    # one api command per line, empty lines and lines starting with # skipped
+    commands = []
+    with open(apifile, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and line[0] != '#':
+                commands.append(line)
+    return commands
 
-if not args.apicommand:
-    print("The program requires an apicommand parameter! (like '-a /control/rcontrol')")
-    print("Look at https://community.mobotix.com/t/getting-started-with-the-http-api/52 for more info")
-    print("or in the help of the camera: http://<ip_address_for_the_camera>/help/help at to bottom of the page")
-    sys.exit()
-
-if args.ssl:
-    use_ssl = True
-else:
-    use_ssl = False
-    
-print('Starting')
-print('Build devicelist...')
-
-# Build devicelist from devicelist file or from single parameter
-# devicelist is a list of lists
-devicelist = []
-if args.devicelist:
-    csv.register_dialect('semicolons', delimiter=';')
-    with open(args.devicelist[0], 'r') as f:
-        reader = csv.reader(f, dialect='semicolons')
-        for row in reader:
-            devicelist.append(row)
-else:
-    devicelist.append(['IP'])
-    devicelist.append([args.deviceIP[0]])
-#devicelist[0] now contains the header
-
-for devicenr in range(1, len(devicelist)):  #skip header
-    #skip device if starts with comment
-    if devicelist[devicenr][0][0] != '#':
-        ipaddr = devicelist[devicenr][0]
-        print('About to program device ' + ipaddr + ' ', end='')
-        if use_ssl:
-            proto = "https://"
-        else:
-            proto = "http://"
+
+def extract(body, extract_re=None):
+    # reduces a response body to the part matching extract_re
+    # (the first group if the regex has one)
+    if extract_re is None:
+        return body
+    m = extract_re.search(body)
+    if m is None:
+        return ''
+    if m.groups():
+        return m.group(1)
+    return m.group(0)
+
+
+def send_commands(row, header, apicommands, username, password,
+                  use_ssl=False, timeout=TIMEOUT, extract_re=None,
+                  session=None):
+    # sends all api commands in sequence to one device (row of a devicelist
+    # with the given header) over a single kept-alive session. Stops at the
+    # first failing command.
+    # returns a list of result records, one for each command sent
+    import requests
+    if session is None:
+        with mxnet.new_session(username, password) as session:
+            return send_commands(row, header, apicommands, username,
+                                 password, use_ssl, timeout, extract_re,
+                                 session)
+    ipaddr = row[0]
+    replacedict = mxnet.labels(header, row)
+    results = []
+    for command in apicommands:
+        command = mxnet.replace_all(command, replacedict)
+        record = {'IP': ipaddr, 'command': command, 'status': '',
+                  'latency_ms': '', 'result': '', 'error': ''}
+        start = time.time()
         try:
-            r = requests.get(proto + ipaddr + args.apicommand[0], auth=(username, password), timeout=TIMEOUT, verify=False)
+            r = session.get(mxnet.base_url(ipaddr, use_ssl) + command,
+                            timeout=timeout)
+            record['status'] = r.status_code
+            record['latency_ms'] = round(1000 * (time.time() - start))
             r.raise_for_status()
-            if r.status_code == 200:
-                print('...OK')
+            record['result'] = extract(r.text, extract_re)
         except requests.exceptions.HTTPError as errh:
-            print ("... Fail. Http Error:",errh)
+            record['error'] = "Http Error: " + str(errh)
         except requests.exceptions.ConnectionError as errc:
-            print ("... Fail. Error Connecting:",errc)
+            record['error'] = "Error Connecting: " + str(errc)
         except requests.exceptions.Timeout as errt:
-            print ("... Fail. Timeout Error:",errt)
+            record['error'] = "Timeout Error: " + str(errt)
         except requests.exceptions.RequestException as err:
-            print ("... Fail. Something weird happened ",err)
-print("Done.")
\ No newline at end of file
+            record['error'] = "Something weird happened " + str(err)
+        results.append(record)
+        if record['error']:
+            break
+    return results
+
+
+def main(argv=None):
+    print('MxApi ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target device IP when programming a single camera")
+    parser.add_argument("-l", "--devicelist", nargs=1, help="specify target device list in CSV when programming multiple camera's")
+    parser.add_argument("-a", "--apicommand", action="append", help="specify api command to send to camera(s). May be repeated.")
+    parser.add_argument("-f", "--apifile", nargs=1, help="specify file with api commands, one per line")
+    parser.add_argument("-u", "--username", nargs=1, help="specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1, help="specify target device admin password")
+    parser.add_argument("-s", "--ssl", help="use SSL to communicate (HTTPS)", action="store_true")
+    parser.add_argument("-t", "--timeout", nargs=1, help="specify cUrl timeout in seconds (default = 3)")
+    parser.add_argument("-o", "--output", nargs=1, help="write status, latency and response of every command to a .jsonl or .csv file")
+    parser.add_argument("-x", "--extract", nargs=1, help="only keep the part of the response matching this regex (or its first group)")
+    parser.add_argument("-w", "--workers", nargs=1, help="specify number of camera's handled at the same time (default = 10)")
+    mxnet.add_policy_arguments(parser)
+    mxnet.add_shard_argument(parser)
+    mxnet.add_progress_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if (args.deviceIP is None and args.devicelist is None) or (args.deviceIP and args.devicelist):
+        print("Either deviceIP or devicelist is required")
+        sys.exit()
+
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
+    else:
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    timeout = TIMEOUT
+    if args.timeout:
+        try:
+            timeout = int(args.timeout[0])
+        except:
+            print("Unable to understand timeout value of " + args.timeout[0])
+            print("Try an interger")
+            sys.exit()
+
+    workers = mxnet.WORKERS
+    if args.workers:
+        try:
+            workers = int(args.workers[0])
+        except:
+            print("Unable to understand workers value of " + args.workers[0])
+            print("Try an interger")
+            sys.exit()
+
+    if args.deviceIP:
+        if not mxnet.validate_ip(args.deviceIP[0]):
+            print("The device %s is not a valid IPv4 address!" % (args.deviceIP[0]))
+            sys.exit()
+
+    if args.devicelist:
+        if not os.path.exists(args.devicelist[0]):
+            print("The devicelist '%s' does not exist in the current directory!" % (args.devicelist[0]))
+            sys.exit()
+
+    apicommands = []
+    if args.apicommand:
+        apicommands.extend(args.apicommand)
+    if args.apifile:
+        if not os.path.exists(args.apifile[0]):
+            print("The apifile '%s' does not exist in the current directory!" % (args.apifile[0]))
+            sys.exit()
+        apicommands.extend(read_apifile(args.apifile[0]))
+
+    if not apicommands:
+        print("The program requires an apicommand parameter! (like '-a /control/rcontrol')")
+        print("Look at https://community.mobotix.com/t/getting-started-with-the-http-api/52 for more info")
+        print("or in the help of the camera: http://<ip_address_for_the_camera>/help/help at to bottom of the page")
+        sys.exit()
+
+    extract_re = None
+    if args.extract:
+        try:
+            extract_re = re.compile(args.extract[0])
+        except re.error as e:
+            print("Unable to understand extract regex " + args.extract[0] + ": " + str(e))
+            sys.exit()
+
+    shard = mxnet.shard_from_args(args)
+
+    if args.ssl:
+        use_ssl = True
+    else:
+        use_ssl = False
+
+    print('Starting')
+    print('Build devicelist...')
+
+    devicelist = mxnet.read_devicelist(args.devicelist and args.devicelist[0],
+                                       args.deviceIP and args.deviceIP[0])
+    policy = mxnet.policy_from_args(args, devicelist[0])
+    #devicelist[0] now contains the header
+
+    output = None
+    if args.output:
+        try:
+            output = mxnet.ResultWriter(
+                mxnet.shard_filename(args.output[0], shard), FIELDNAMES)
+        except IOError:
+            print("Error: Unable to write output file " + args.output[0])
+            sys.exit()
+
+    def send(row):
+        return send_commands(row, devicelist[0], apicommands, username,
+                             password, use_ssl, timeout, extract_re)
+
+    rows = list(mxnet.devices(devicelist, shard))
+    progress = mxnet.Progress(len(rows), workers, args.progress)
+    for (row, results) in mxnet.run_pool(progress.track(send), rows, workers,
+                                         policy):
+        ipaddr = row[0]
+        if output:
+            for record in results:
+                output.write(record)
+        record = results[-1]
+        progress.finished(bool(record['error']))
+        if record['error']:
+            progress.print('Device ' + ipaddr + ' ... Fail at command %d of %d (%s). %s'
+                           % (len(results), len(apicommands), record['command'],
+                              record['error']))
+        else:
+            progress.print('Device ' + ipaddr + ' ...OK (%d commands)' % (len(results)))
+    progress.close()
+    if policy:
+        policy.close()
+
+    if output:
+        output.close()
+    print("Done.")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,203 +10,343 @@
 # use option -h or --help for instructions
 # See https://github.com/keptenkurk/mxpgm/blob/master/README.md for
 # instructions
+# The backup can also be used from other python code:
+#   import mxbackup
+#   record = mxbackup.backup_device('192.168.1.24', 'admin', 'meinsm')
 #
 # release info
 # 1.0 first release 29/8/17 Paul Merkx
 # 1.1 added SSL support and verbose switch, moved to Python3
 # 1.2 -skip version
 # 1.3 Change to using requests instead of pycurl
+# 1.4 backup available as importable function, -w option to read camera's
+#     concurrently while a single writer saves the configs, failed devices
+#     are saved in a devicelist for a retry, -c option to only read the
+#     config of camera's that changed since their last backup
 # ****************************************************************************
 import os
-import requests
-from http import HTTPStatus
 import sys
 import argparse
 import csv
-import io
 import datetime
+import queue
+import threading
+import mxcfg
+import mxnet
 
-RELEASE = '1.3 - 1-6-2020'
-TMPCONFIG = 'config.tmp'
+RELEASE = '1.4 - 19-10-2026'
 TIMEOUT = 10  # requests timeout (overwriteable by -t option)
-# Ignore the warning that SSL CA will not be checked
-requests.packages.urllib3.disable_warnings(requests.packages.urllib3.
-                                           exceptions.InsecureRequestWarning)
+BACKUP_CMD = '\nhelo\nview configfile\nquit\n\n'
+FAILEDFILE = 'backup_failed.csv'
+STATEFILE = 'mxbackup.state'  # timestamp and file of the last backups
 
 
-def filewritable(filename):
+def backup_filename(ipaddr, stamp=None):
+    # IPaddress_datetime.cfg like 192-168-1-24_170903-2214.cfg
+    if stamp is None:
+        stamp = datetime.datetime.now().strftime("%y%m%d-%H%M")
+    return ipaddr.replace(".", "-") + "_" + stamp + ".cfg"
+
+
+def fetch_config(session, ipaddr, use_ssl=False, timeout=TIMEOUT):
+    # reads the configuration of a camera
+    # returns (True, response) or (False, reason of failure)
+    return mxnet.transfer(session, ipaddr, use_ssl, BACKUP_CMD, timeout)
+
+
+def fetch_changed(session, ipaddr, use_ssl=False, timeout=TIMEOUT,
+                  state=None):
+    # only reads the configuration of a camera when the VERSION or DATE of
+    # its timestamp section differ from its last backup in state (or that
+    # backup is gone). The timestamp section is a few hundred bytes, the
+    # configuration tens of kB.
+    # returns (True, response), (True, None) for an unchanged camera or
+    # (False, reason of failure)
+    last = (state or {}).get(ipaddr)
+    if last and os.path.exists(last['file']):
+        (result, timestamp) = mxnet.device_timestamp(session, ipaddr,
+                                                     use_ssl, timeout)
+        if not result:
+            return False, timestamp
+        if timestamp and timestamp.get('VERSION') == last.get('VERSION') \
+                and timestamp.get('DATE') == last.get('DATE'):
+            return True, None
+    return fetch_config(session, ipaddr, use_ssl, timeout)
+
+
+def config_timestamp(received):
+    # VERSION and DATE of the timestamp section of a read configuration
+    cfg = mxcfg.CfgFile('', received.encode(mxcfg.ENCODING))
+    if 'timestamp' not in cfg:
+        return {}
+    return mxcfg.parse_timestamp(cfg.section('timestamp'))
+
+
+def save_config(ipaddr, received, stamp=None):
+    # saves a configuration read by fetch_config to disk
+    # returns a record with the IP, the written file and an error
+    # ('' when the config was saved)
+    record = {'IP': ipaddr, 'file': '', 'error': ''}
+    cfgfilename = backup_filename(ipaddr, stamp)
     try:
-        f = open(filename, 'w')
-        f.close()
+        # remove the lines the camera adds around the config
+        with open(cfgfilename, 'w') as outfile:
+            outfile.write(mxcfg.strip_transfer(received))
     except IOError:
-        print('Unable to write to ' + filename +
-              '. It might be open in another application.')
-        return False
-    os.remove(filename)
-    return True
-
-
-def validate_ip(s):
-    a = s.split('.')
-    if len(a) != 4:
-        return False
-    for x in a:
-        if not x.isdigit():
-            return False
-        i = int(x)
-        if i < 0 or i > 255:
-            return False
-    return True
-
-
-def transfer(ipaddr, use_ssl, username, password, commandfile):
-    # transfers commandfile to camera
-    if use_ssl:
-        url = 'https://' + ipaddr + '/admin/remoteconfig'
+        record['error'] = 'Unable to write to ' + cfgfilename + \
+            '. It might be open in another application.'
+        return record
+    record['file'] = cfgfilename
+    return record
+
+
+def backup_device(ipaddr, username, password, use_ssl=False,
+                  timeout=TIMEOUT, session=None, stamp=None):
+    # reads the configuration of a camera and saves it to disk
+    # returns a record with the IP, the written file and an error
+    # ('' when the backup succeeded)
+    if session is None:
+        with mxnet.new_session(username, password) as session:
+            (result, received) = fetch_config(session, ipaddr, use_ssl,
+                                              timeout)
+    else:
+        (result, received) = fetch_config(session, ipaddr, use_ssl, timeout)
+    if not result:
+        return {'IP': ipaddr, 'file': '', 'error': received}
+    return save_config(ipaddr, received, stamp)
+
+
+class BackupWriter(threading.Thread):
+    # Single stage saving the configs fetched by the workers, so the workers
+    # only wait for the network and the disk is written by one thread.
+    # Devices that failed are written with their devicelist row (and the
+    # reason) to failedfile which can be used as devicelist for a retry.
+    # The timestamp and file of every saved config are kept in state (when
+    # given) for fetch_changed. A response of None is an unchanged camera.
+    # The results are counted in progress (a mxnet.Progress) when given.
+    # A device that can't be saved for any reason counts as failed. When
+    # even the failedfile can't be written the error is raised by close(),
+    # the configs still coming in are dropped so the workers never block.
+    def __init__(self, header, failedfile=FAILEDFILE, stamp=None, size=10,
+                 state=None, progress=None):
+        super().__init__(daemon=True)
+        self.progress = progress or mxnet.Progress(0, enabled=False)
+        self.header = header
+        self.stamp = stamp
+        self.state = state
+        self.queue = queue.Queue(size)
+        self.saved = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.error = None
+        self.failedfile = open(failedfile, 'w', newline='')
+        self.writer = csv.writer(self.failedfile, dialect='semicolons')
+        self.writer.writerow(header + ['error'])
+
+    def put(self, row, result, received):
+        self.queue.put((row, result, received))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error:
+                continue
+            try:
+                self.handle(*item)
+            except Exception as e:
+                try:
+                    self.fail(item[0], 'Unable to save the config: ' + str(e))
+                except Exception as e:
+                    self.error = e
+
+    def handle(self, row, result, received):
+        ipaddr = row[0]
+        if result and received is None:
+            self.unchanged += 1
+            self.progress.finished()
+            self.progress.print('Backup of ' + ipaddr + ' unchanged since ' +
+                                self.state[ipaddr]['file'])
+            return
+        if not result:
+            self.fail(row, received)
+            return
+        record = save_config(ipaddr, received, self.stamp)
+        if record['error']:
+            self.fail(row, record['error'])
+            return
+        if self.state is not None:
+            self.state[ipaddr] = dict(config_timestamp(received),
+                                      file=record['file'])
+        self.saved += 1
+        self.progress.finished()
+        self.progress.print('Backup of ' + ipaddr + ' succeeded.')
+
+    def fail(self, row, error):
+        self.failed += 1
+        self.progress.finished(True)
+        self.progress.print(error + ' ERROR: Reading of ' + row[0] +
+                            ' failed.')
+        padding = [''] * (len(self.header) - len(row))
+        self.writer.writerow(row + padding + [error])
+        self.failedfile.flush()
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        self.failedfile.close()
+        if self.error:
+            raise self.error
+
+
+def main(argv=None):
+    print('MxBackup ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Saves entire configuration of multiple Mobotix camera\'s to \
+          local disk.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--deviceIP", nargs=1, help="\
+                        specify target device IP when reading a single camera")
+    parser.add_argument("-l", "--devicelist", nargs=1, help="\
+                specify target device list in CSV when reading multiple camera's")
+    parser.add_argument("-u", "--username", nargs=1, help="\
+                        specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1, help="\
+                        specify target device admin password")
+    parser.add_argument("-s", "--ssl", help="\
+                        use SSL to communicate (HTTPS)", action="store_true")
+    parser.add_argument("-t", "--timeout", nargs=1, help="\
+                        specify timeout in seconds (default = 10)")
+    parser.add_argument("-w", "--workers", nargs=1, help="\
+                        specify number of camera's read at the same time \
+                        (default = 1)")
+    parser.add_argument("-f", "--failed", nargs=1, help="\
+                        specify devicelist file for the devices that failed \
+                        (default = backup_failed.csv)")
+    parser.add_argument("-c", "--changed", help="\
+                        only read camera's whose config changed since their \
+                        last backup", action="store_true")
+    mxnet.add_policy_arguments(parser)
+    mxnet.add_shard_argument(parser)
+    mxnet.add_progress_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if (args.deviceIP is None and args.devicelist is None) or \
+       (args.deviceIP and args.devicelist):
+        print("Either deviceIP or devicelist is required")
+        sys.exit()
+
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
     else:
-        url = 'http://' + ipaddr + '/admin/remoteconfig'
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    if args.deviceIP:
+        if not mxnet.validate_ip(args.deviceIP[0]):
+            print("Warning: The device %s is not a valid IPv4 address!"
+                  % (args.deviceIP[0]))
+            print("Continuing using %s as devicename."
+                  % (args.deviceIP[0]))
+
+    if args.devicelist:
+        if not os.path.exists(args.devicelist[0]):
+            print("The devicelist '%s' does not exist in the current directory!"
+                  % (args.devicelist[0]))
+            sys.exit()
+
     try:
-        with open(commandfile, 'rb') as payload:
-            headers = {'content-type': 'application/x-www-form-urlencoded'}
-            response = requests.post(url, auth=(username, password),
-                                     data=payload, verify=False,
-                                     headers=headers, timeout=TIMEOUT)
-    except requests.ConnectionError:
-        print('Unable to connect. ', end='')
-        return False, ''
-    except requests.Timeout:
-        print('Timeout. ', end='')
-        return False, ''
-    except requests.exceptions.RequestException as e:
-        print('Uncaught error:', str(e), end='')
-        return False, ''
+        timeout = TIMEOUT
+        if args.timeout:
+            timeout = int(args.timeout[0])
+        workers = 1
+        if args.workers:
+            workers = int(args.workers[0])
+    except ValueError:
+        print("Unable to understand timeout or workers value")
+        print("Try an interger")
+        sys.exit()
+
+    failedfile = FAILEDFILE
+    if args.failed:
+        failedfile = args.failed[0]
+    shard = mxnet.shard_from_args(args)
+    failedfile = mxnet.shard_filename(failedfile, shard)
+    statefile = mxnet.shard_filename(STATEFILE, shard)
+
+    use_ssl = bool(args.ssl)
+
+    print('Starting')
+
+    if args.devicelist:
+        print('Build devicelist...')
     else:
-        content = response.text
-        if response:
-            if (content.find('#read::') != 0):
-                print('Are you sure this is Mobotix? ', end='')
-                return False, ''
-            else:
-                return True, content
-        else:
-            print('HTTP response code: ',
-                  HTTPStatus(response.status_code).phrase)
-            return False, ''
-
-
-# ***************************************************************
-# *** Main program ***
-# ***************************************************************
-print('MxBackup ' + RELEASE + ' by (c) Simac Healthcare.')
-print('Saves entire configuration of multiple Mobotix camera\'s to \
-      local disk.')
-print('Disclaimer: ')
-print('USE THIS SOFTWARE AT YOUR OWN RISK')
-print(' ')
-
-# *** Read arguments passed on commandline
-parser = argparse.ArgumentParser()
-parser.add_argument("-d", "--deviceIP", nargs=1, help="\
-                    specify target device IP when reading a single camera")
-parser.add_argument("-l", "--devicelist", nargs=1, help="\
-            specify target device list in CSV when reading multiple camera's")
-parser.add_argument("-u", "--username", nargs=1, help="\
-                    specify target device admin username")
-parser.add_argument("-p", "--password", nargs=1, help="\
-                    specify target device admin password")
-parser.add_argument("-s", "--ssl", help="\
-                    use SSL to communicate (HTTPS)", action="store_true")
-
-args = parser.parse_args()
-
-# *** Check validity of the arguments
-if (args.deviceIP is None and args.devicelist is None) or \
-   (args.deviceIP and args.devicelist):
-    print("Either deviceIP or devicelist is required")
-    sys.exit()
-
-if args.username is None:
-    print("Default Admin account assumed")
-    username = 'admin'
-else:
-    username = args.username[0]
-
-if args.password is None:
-    print("Default Admin password assumed")
-    password = 'meinsm'
-else:
-    password = args.password[0]
-
-if args.deviceIP:
-    if not validate_ip(args.deviceIP[0]):
-        print("Warning: The device %s is not a valid IPv4 address!"
-              % (args.deviceIP[0]))
-        print("Continuing using %s as devicename."
-              % (args.deviceIP[0]))
-
-if args.devicelist:
-    if not os.path.exists(args.devicelist[0]):
-        print("The devicelist '%s' does not exist in the current directory!"
-              % (args.devicelist[0]))
+        print('Found device ' + args.deviceIP[0])
+    devicelist = mxnet.read_devicelist(args.devicelist and args.devicelist[0],
+                                       args.deviceIP and args.deviceIP[0])
+
+    policy = mxnet.policy_from_args(args, devicelist[0])
+
+    # all backups of this run get the same timestamp
+    stamp = datetime.datetime.now().strftime("%y%m%d-%H%M")
+    # the last backups are always recorded so -c can be used the next run
+    # the workers compare with a copy, the writer updates state
+    state = mxnet.read_cache(statefile)
+    previous = dict(state)
+    rows = list(mxnet.devices(devicelist, shard))
+    (rows, unresolved) = mxnet.resolve_devices(rows)
+    progress = mxnet.Progress(len(rows) + len(unresolved), workers,
+                              args.progress)
+    try:
+        writer = BackupWriter(devicelist[0], failedfile, stamp, 2 * workers,
+                              state, progress)
+    except IOError:
+        print("Error: Unable to write " + failedfile)
         sys.exit()
+    writer.start()
+    for (row, error) in unresolved:
+        writer.put(row, False, error)
+    session = mxnet.new_session(username, password, pool=workers)
+
+    def fetch(row):
+        if args.changed:
+            return fetch_changed(session, row[0], use_ssl, timeout,
+                                 previous)
+        return fetch_config(session, row[0], use_ssl, timeout)
+
+    with session:
+        for (row, (result, received)) in mxnet.run_pool(
+                progress.track(fetch), rows, workers, policy):
+            writer.put(row, result, received)
+    try:
+        writer.close()
+    except IOError as e:
+        print("Error: Unable to write " + failedfile + ": " + str(e))
+        sys.exit()
+    progress.close()
+    if policy:
+        policy.close()
+    mxnet.write_cache(statefile, state)
+    print('')
+    print('%d backups saved, %d unchanged, %d failed.'
+          % (writer.saved, writer.unchanged, writer.failed))
+    if writer.failed:
+        print('Retry the failed devices with -l ' + failedfile)
+    print("Done.")
+
 
-if args.ssl:
-    use_ssl = True
-else:
-    use_ssl = False
-
-print('Starting')
-
-# Build devicelist from devicelist file or from single parameter
-# devicelist is a list of lists
-devicelist = []
-if args.devicelist:
-    print('Build devicelist...')
-    csv.register_dialect('semicolons', delimiter=';')
-    with open(args.devicelist[0], 'r') as f:
-        reader = csv.reader(f, dialect='semicolons')
-        for row in reader:
-            devicelist.append(row)
-else:
-    print('Found device ' + args.deviceIP[0])
-    devicelist.append(['IP'])
-    devicelist.append([args.deviceIP[0]])
-
-for devicenr in range(1, len(devicelist)):
-    # skip device if starts with comment
-    if devicelist[devicenr][0][0] != '#':
-        # build API commandfile to read the config
-        if filewritable(TMPCONFIG):
-            outfile = open(TMPCONFIG, 'w')
-            outfile.write('\n')
-            outfile.write('helo\n')
-            outfile.write('view configfile\n')
-            outfile.write('quit\n')
-            outfile.write('\n')
-            outfile.close()
-            ipaddr = devicelist[devicenr][0]
-            cfgfilename = ipaddr.replace(".", "-") + "_" + \
-                datetime.datetime.now().strftime("%y%m%d-%H%M") + \
-                ".cfg"
-            if filewritable(cfgfilename):
-                (result, received) = transfer(ipaddr, use_ssl,
-                                              username, password, TMPCONFIG)
-                if result:
-                    print('Backup of ' + ipaddr + ' succeeded.')
-                    outfile = open(cfgfilename, 'w')
-                    outfile.write(received)
-                    outfile.close()
-
-                    # remove first 4 and last 3 lines
-                    outfile = open(cfgfilename, 'r')
-                    configfiledata = outfile.readlines()
-                    outfile.close()
-
-                    outfile = open(cfgfilename, 'w')
-                    for line in range(4, len(configfiledata)-3):
-                        outfile.write(configfiledata[line])
-                    outfile.close()
-                else:
-                    print('ERROR: Reading of ' + ipaddr + ' failed.')
-            os.remove(TMPCONFIG)
-print("Done.")
+if __name__ == '__main__':
+    main()
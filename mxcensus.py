@@ -0,0 +1,201 @@
+# ****************************************************************************
+# * mxcensus.py
+# * Mobotix firmware version census
+#
+# This script queries the SW version of (multiple) mobotix camera's at the
+# same time through the timestamp section of their config and writes a
+# table of the versions found. The answers are cached with a time to live
+# so following runs, and the version check of mxrestore.py, only query the
+# camera's that have no fresh answer in the cache.
+# usage:
+# python mxcensus.py [options]
+# use option -h or --help for instructions
+# The census can also be used from other python code:
+#   import mxcensus, mxnet
+#   cache = mxnet.read_cache(mxcensus.CACHEFILE)
+#   record = mxcensus.census_device('192.168.1.24', 'admin', 'meinsm',
+#                                   cache=cache)
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import os
+import sys
+import argparse
+import time
+import mxnet
+
+RELEASE = '1.0 - 19-10-2026'
+TIMEOUT = 10  # requests timeout (overwriteable by -t option)
+TTL = mxnet.TIMESTAMP_TTL  # seconds a cached version is used
+CACHEFILE = mxnet.TIMESTAMP_CACHE
+OUTFILE = 'census.csv'
+FIELDNAMES = ['IP', 'version', 'date', 'source', 'age_s', 'error']
+
+
+def census_device(ipaddr, username, password, use_ssl=False,
+                  timeout=TIMEOUT, session=None, cache=None, ttl=TTL):
+    # SW version of a camera from the cache or from the camera itself
+    # returns a record with the IP, the version, the date of the stored
+    # config, where the answer came from (camera or cache), its age and an
+    # error ('' when a version is known)
+    if cache is None:
+        cache = {}
+    if session is None and mxnet.cached_timestamp(cache, ipaddr, ttl) is None:
+        with mxnet.new_session(username, password) as session:
+            return census_device(ipaddr, username, password, use_ssl,
+                                 timeout, session, cache, ttl)
+    record = {'IP': ipaddr, 'version': '', 'date': '', 'source': 'camera',
+              'age_s': 0, 'error': ''}
+    (result, entry, cached) = mxnet.lookup_timestamp(session, ipaddr, use_ssl,
+                                                     timeout, cache, ttl)
+    if not result:
+        record['error'] = entry
+        return record
+    if cached:
+        record['source'] = 'cache'
+    record['version'] = entry.get('VERSION', '')
+    record['date'] = entry.get('DATE', '')
+    record['age_s'] = round(time.time() - entry['time'])
+    return record
+
+
+def main(argv=None):
+    start = time.time()
+
+    print('MxCensus ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target device IP when querying a single camera")
+    parser.add_argument("-l", "--devicelist", nargs=1, help="specify target device list in CSV when querying multiple camera's")
+    parser.add_argument("-u", "--username", nargs=1, help="specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1, help="specify target device admin password")
+    parser.add_argument("-s", "--ssl", help="use SSL to communicate (HTTPS)", action="store_true")
+    parser.add_argument("-t", "--timeout", nargs=1, help="specify timeout in seconds (default = 10)")
+    parser.add_argument("-w", "--workers", nargs=1, help="specify number of camera's handled at the same time (default = 10)")
+    parser.add_argument("-o", "--output", nargs=1, help="write the version table to a .csv or .jsonl file (default = census.csv)")
+    parser.add_argument("-c", "--cachefile", nargs=1, help="specify cache file (default = mxcensus.cache)")
+    parser.add_argument("--ttl", nargs=1, help="specify seconds a cached version is used, 0 asks every camera (default = 3600)")
+    mxnet.add_policy_arguments(parser)
+    mxnet.add_shard_argument(parser)
+    mxnet.add_progress_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if (args.deviceIP is None and args.devicelist is None) or (args.deviceIP and args.devicelist):
+        print("Either deviceIP or devicelist is required")
+        sys.exit()
+
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
+    else:
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    try:
+        timeout = TIMEOUT
+        if args.timeout:
+            timeout = int(args.timeout[0])
+        workers = mxnet.WORKERS
+        if args.workers:
+            workers = int(args.workers[0])
+        ttl = TTL
+        if args.ttl:
+            ttl = int(args.ttl[0])
+    except ValueError:
+        print("Unable to understand timeout, workers or ttl value")
+        print("Try an interger")
+        sys.exit()
+
+    if args.deviceIP:
+        if not mxnet.validate_ip(args.deviceIP[0]):
+            print("The device %s is not a valid IPv4 address!" % (args.deviceIP[0]))
+            sys.exit()
+
+    if args.devicelist:
+        if not os.path.exists(args.devicelist[0]):
+            print("The devicelist '%s' does not exist in the current directory!" % (args.devicelist[0]))
+            sys.exit()
+
+    cachefile = CACHEFILE
+    if args.cachefile:
+        cachefile = args.cachefile[0]
+
+    outfilename = OUTFILE
+    if args.output:
+        outfilename = args.output[0]
+
+    shard = mxnet.shard_from_args(args)
+    cachefile = mxnet.shard_filename(cachefile, shard)
+    outfilename = mxnet.shard_filename(outfilename, shard)
+
+    use_ssl = bool(args.ssl)
+
+    print('Starting')
+    print('Build devicelist...')
+
+    devicelist = mxnet.read_devicelist(args.devicelist and args.devicelist[0],
+                                       args.deviceIP and args.deviceIP[0])
+    policy = mxnet.policy_from_args(args, devicelist[0])
+
+    try:
+        output = mxnet.ResultWriter(outfilename, FIELDNAMES)
+    except IOError:
+        print("Error: Unable to write output file " + outfilename)
+        sys.exit()
+
+    cache = mxnet.read_cache(cachefile)
+    rows = list(mxnet.devices(devicelist, shard))
+    progress = mxnet.Progress(len(rows), workers, args.progress)
+    session = mxnet.new_session(username, password, pool=workers)
+
+    def census(row):
+        return census_device(row[0], username, password, use_ssl, timeout,
+                             session, cache, ttl)
+
+    versions = {}
+    nr_cached = 0
+    nr_failed = 0
+    with output, session:
+        for (row, record) in mxnet.run_pool(progress.track(census), rows,
+                                            workers, policy):
+            output.write(record)
+            progress.finished(bool(record['error']))
+            if record['error']:
+                nr_failed += 1
+                progress.print('Device ' + record['IP'] + ' ... Fail. ' +
+                               record['error'])
+                continue
+            if record['source'] == 'cache':
+                nr_cached += 1
+            versions[record['version']] = versions.get(record['version'], 0) + 1
+    progress.close()
+    if policy:
+        policy.close()
+    mxnet.write_cache(cachefile, cache)
+
+    print("")
+    for version in sorted(versions):
+        print("%-20s %d camera's" % (version or 'unknown', versions[version]))
+    end = time.time()
+    exectime = round(1000*(end-start))
+    print("")
+    print("Found the version of %d camera's (%d from cache, %d failed) in "
+          "%d milliseconds."
+          % (sum(versions.values()), nr_cached, nr_failed, exectime))
+    print("Version table written to " + outfilename)
+
+
+if __name__ == '__main__':
+    main()
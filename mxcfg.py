@@ -0,0 +1,300 @@
+# ****************************************************************************
+# * mxcfg.py
+# * Shared parser for Mobotix configuration files
+#
+# A Mobotix cfg file (as saved by mxbackup.py or the camera itself) starts
+# with a few header lines like "#:MX-V5.2.0.61" followed by sections:
+#   SECTION <name>
+#   ...
+#   ENDSECTION <name>
+# CfgFile makes a single pass over the file to find where every section
+# starts and ends. A section is only decoded when it is asked for, so tools
+# that need just the version or one section never parse the whole file.
+# Large files are read through mmap instead of being loaded in memory.
+# walk_cfgfiles finds cfg files in directory trees and inside zip and
+# tar(.gz) archives without extracting them. Small archive members are read
+# in memory, large ones are streamed into a temporary file and mmap-ed.
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import io
+import mmap
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+import zlib
+
+ENCODING = 'utf-8'
+MMAP_SIZE = 1024 * 1024  # files of this size or larger are mmap-ed
+TRANSFER_HEADER = 4  # lines added by the camera before a viewed configfile
+TRANSFER_FOOTER = 3  # and after it
+SECTION_RE = re.compile(rb'^(END)?SECTION[ \t]+([^\r\n]*)', re.MULTILINE)
+ARCHIVE_EXTS = ('.zip', '.tar', '.tar.gz', '.tgz')
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error,
+                  IOError)
+
+
+def decode(data):
+    return data.decode(ENCODING, errors='replace').replace('\r\n', '\n')
+
+
+class CfgFile:
+    # Section index of one cfg file. Either give a filename, the raw
+    # file contents as bytes (data) or an open binary file (fileobj, closed
+    # by close()) with a name used for reporting.
+    def __init__(self, filename, data=None, fileobj=None):
+        self.filename = filename
+        self._file = None
+        self._mmap = None
+        if data is None:
+            self._file = fileobj or open(filename, 'rb')
+            if os.fstat(self._file.fileno()).st_size >= MMAP_SIZE:
+                self._mmap = mmap.mmap(self._file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+                data = self._mmap
+            else:
+                data = self._file.read()
+                self._file.close()
+                self._file = None
+        self.data = data
+        self._header_end = len(data)
+        self._index = {}  # section name -> (start, end) offsets
+        self._cache = {}
+        self._build_index()
+
+    def _build_index(self):
+        start = None
+        for m in SECTION_RE.finditer(self.data):
+            name = m.group(2).strip().decode(ENCODING, errors='replace')
+            if m.group(1) is None:
+                if start is None and not self._index:
+                    self._header_end = m.start()
+                start = (name, m.start())
+            elif start is not None and start[0] == name:
+                end = self.data.find(b'\n', m.end())
+                if end == -1:
+                    end = len(self.data)
+                else:
+                    end += 1
+                self._index[name] = (start[1], end)
+                start = None
+
+    @property
+    def header(self):
+        # the header lines before the first section
+        return decode(bytes(self.data[:self._header_end])).splitlines()
+
+    @property
+    def version(self):
+        return header_version(self.header)
+
+    def sections(self):
+        # section names in the order they appear in the file
+        return list(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def section_bytes(self, name):
+        # raw SECTION ... ENDSECTION block of a section
+        (start, end) = self._index[name]
+        return bytes(self.data[start:end])
+
+    def section(self, name):
+        # SECTION ... ENDSECTION block of a section as text
+        if name not in self._cache:
+            self._cache[name] = decode(self.section_bytes(name))
+        return self._cache[name]
+
+    def lines(self):
+        # all lines of the file (including line ends) one at a time
+        pos = 0
+        size = len(self.data)
+        while pos < size:
+            end = self.data.find(b'\n', pos)
+            if end == -1:
+                end = size
+            else:
+                end += 1
+            yield decode(bytes(self.data[pos:end]))
+            pos = end
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scan_files(directory, recursive=False):
+    # os.DirEntry of all files in directory (and its subdirectories)
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            yield entry
+        elif recursive and entry.is_dir():
+            yield from scan_files(entry.path, recursive)
+
+
+def find_cfgfiles(extension, directory=None, recursive=False):
+    # full path of all files in directory (default the current directory)
+    # having the given extension
+    if directory is None:
+        directory = os.getcwd()
+    for entry in scan_files(directory, recursive):
+        if entry.name.endswith(extension):
+            yield entry.path
+
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_EXTS)
+
+
+def unreadable(filename, error):
+    def open_cfg():
+        raise IOError('Unable to read %s: %s' % (filename, error))
+    return open_cfg
+
+
+def member_cfg(name, size, open_member):
+    # CfgFile of an archive member, open_member() returns the member as a
+    # file. Members of MMAP_SIZE or more are copied in chunks to a temporary
+    # file instead of being read in memory at once. Raises IOError when the
+    # member can not be read.
+    try:
+        with open_member() as member:
+            if size < MMAP_SIZE:
+                return CfgFile(name, member.read())
+            spool = tempfile.TemporaryFile()
+            try:
+                shutil.copyfileobj(member, spool, MMAP_SIZE)
+                spool.flush()
+                spool.seek(0)
+            except BaseException:
+                spool.close()
+                raise
+    except ARCHIVE_ERRORS as e:
+        raise IOError('Unable to read %s: %s' % (name, e))
+    return CfgFile(name, fileobj=spool)
+
+
+def archive_members(archive, extension):
+    # (name, stamp, open) of the members of a zip or tar(.gz) archive
+    # having the given extension, see walk_cfgfiles
+    try:
+        if archive.lower().endswith('.zip'):
+            with zipfile.ZipFile(archive) as z:
+                for info in z.infolist():
+                    if info.is_dir() or not info.filename.endswith(extension):
+                        continue
+                    name = os.path.join(archive, info.filename)
+                    stamp = [info.file_size,
+                             time.mktime(info.date_time + (0, 0, -1))]
+                    yield name, stamp, (lambda info=info, name=name:
+                                        member_cfg(name, info.file_size,
+                                                   lambda: z.open(info)))
+        else:
+            with tarfile.open(archive, 'r:*') as tar:
+                for member in tar:
+                    if not member.isfile() or \
+                            not member.name.endswith(extension):
+                        continue
+                    name = os.path.join(archive, member.name)
+                    stamp = [member.size, member.mtime]
+                    yield name, stamp, (lambda member=member, name=name:
+                                        member_cfg(name, member.size,
+                                                   lambda: tar.extractfile(
+                                                       member)))
+    except ARCHIVE_ERRORS as e:
+        yield archive, None, unreadable(archive, e)
+
+
+def walk_cfgfiles(extension, directory=None, recursive=False,
+                  archives=False):
+    # (name, stamp, open) of all cfg files in directory (default the
+    # current directory) having the given extension, including those in
+    # subdirectories (recursive) and in zip and tar(.gz) archives
+    # (archives). Members of an archive are named <archive>/<member>.
+    # stamp is [size, mtime] and open() returns the CfgFile, raising
+    # IOError when it can not be read. Call open() before asking for the
+    # next file, members of a tar.gz can only be read in order.
+    if directory is None:
+        directory = os.getcwd()
+    for entry in scan_files(directory, recursive):
+        if archives and is_archive(entry.name):
+            yield from archive_members(entry.path, extension)
+        elif entry.name.endswith(extension):
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                yield entry.path, None, unreadable(entry.path, e)
+                continue
+            yield (entry.path, [stat.st_size, stat.st_mtime],
+                   (lambda path=entry.path: CfgFile(path)))
+
+
+def header_version(header):
+    # camera SW version like MX-V5.2.0.61 from the header lines
+    for line in header:
+        if line.find('#:MX-') == 0:
+            return line[2:].strip()
+    return ''
+
+
+def read_header(filename):
+    # only reads the header lines in front of the first section
+    header = []
+    with open(filename, 'rb') as f:
+        for line in f:
+            if SECTION_RE.match(line):
+                break
+            header.append(decode(line).rstrip('\n'))
+    return header
+
+
+def read_version(filename):
+    return header_version(read_header(filename))
+
+
+def parse_timestamp(received):
+    # VERSION and DATE of a viewed timestamp section like
+    # {'VERSION': 'MX-V5.2.0.61', 'DATE': '...'}
+    timestamp = {}
+    for line in io.StringIO(received, newline=None):
+        (key, sep, value) = line.rstrip('\n').partition('=')
+        if sep and key in ('VERSION', 'DATE'):
+            timestamp[key] = value
+    return timestamp
+
+
+def section_params(section):
+    # the key=value lines of a SECTION ... ENDSECTION block as a list of
+    # (key, value) in the order they appear
+    params = []
+    for line in io.StringIO(section, newline=None):
+        line = line.rstrip('\n')
+        if line.startswith('#') or line.startswith('SECTION') or \
+                line.startswith('ENDSECTION'):
+            continue
+        (key, sep, value) = line.partition('=')
+        if sep:
+            params.append((key.strip(), value))
+    return params
+
+
+def strip_transfer(received):
+    # removes the lines the camera adds around a viewed configfile
+    lines = io.StringIO(received, newline=None).readlines()
+    return ''.join(lines[TRANSFER_HEADER:len(lines) - TRANSFER_FOOTER])
@@ -0,0 +1,336 @@
+# ****************************************************************************
+# * mxdaemon.py
+# * Long running scheduler for periodic Mobotix fleet jobs
+#
+# Runs backups, MI event checks and api calls on (multiple) mobotix camera's
+# at a fixed interval without paying interpreter startup, devicelist parsing
+# and connection setup on every run like a cron job would.
+# All jobs share one bounded pool of workers and one pool of kept-alive
+# connections. The start of every device is spread (jitter) over the first
+# seconds of a run so not all camera's are hit at the same moment.
+# A job that is still running when it is due again is skipped (coalesced)
+# instead of being stacked on top of the running one.
+# With --grouplimit and --grouprate the number of camera's and the bandwidth
+# per subnet (or devicelist column, --groupby) are limited for all jobs
+# together, devices of other groups go first while a group is full.
+# With --shard i/N only part i of the devices of every job is handled and
+# the result files get .iofN in their name, so N hosts can share the jobs.
+#
+# The jobs are read from a CSV file (; separated) with a header line:
+#   name;type;interval;devicelist;argument
+#   nightly;backup;86400;cams.csv;
+#   mic;miccheck;900;cams.csv;
+#   ahoff;api;3600;cams.csv;/control/rcontrol?action=...
+# type is backup, miccheck or api, interval is in seconds and argument is
+# the api command for api jobs ({LABEL} parameters are replaced like mxapi).
+# The results of every run are written to <resultdir>/<name>_<start>.jsonl
+# and backups are saved in the current directory like mxbackup.py does.
+#
+# usage:
+# python mxdaemon.py [options]
+# use option -h or --help for instructions
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import os
+import sys
+import argparse
+import csv
+import time
+import datetime
+import random
+import mxapi
+import mxbackup
+import mxmic
+import mxnet
+
+RELEASE = '1.0 - 19-10-2026'
+TIMEOUT = 10  # requests timeout (overwriteable by -t option)
+JITTER = 60  # seconds over which the devices of a run are spread
+RESULTDIR = 'results'
+JOBTYPES = ('backup', 'miccheck', 'api')
+FIELDNAMES = ['IP', 'job', 'start', 'latency_ms', 'result', 'error']
+
+
+class Job:
+    def __init__(self, name, jobtype, interval, listfile, argument):
+        self.name = name
+        self.jobtype = jobtype
+        self.interval = interval
+        self.listfile = listfile
+        self.argument = argument
+        self.next_run = time.time()
+        self.running = False
+        self.coalesced = 0
+        self.listmtime = None
+        self.devicelist = None
+
+    def devices(self):
+        # the devicelist is only read again when the file has changed
+        mtime = os.path.getmtime(self.listfile)
+        if mtime != self.listmtime:
+            self.devicelist = mxnet.read_devicelist(self.listfile, None)
+            self.listmtime = mtime
+        return list(mxnet.devices(self.devicelist))
+
+
+def read_jobs(jobfile):
+    jobs = []
+    with open(jobfile, 'r') as f:
+        reader = csv.reader(f, dialect='semicolons')
+        next(reader, None)  # skip header
+        for row in reader:
+            if not row or not row[0] or row[0][0] == '#':
+                continue
+            row = row + [''] * (5 - len(row))
+            if row[1] not in JOBTYPES:
+                raise ValueError("unknown type '%s' for job %s"
+                                 % (row[1], row[0]))
+            if not os.path.exists(row[3]):
+                raise ValueError("devicelist '%s' of job %s does not exist"
+                                 % (row[3], row[0]))
+            if row[1] == 'api' and not row[4]:
+                raise ValueError("api job %s has no api command" % (row[0]))
+            try:
+                interval = int(row[2])
+            except ValueError:
+                interval = 0
+            if interval <= 0:
+                raise ValueError("invalid interval '%s' for job %s"
+                                 % (row[2], row[0]))
+            jobs.append(Job(row[0], row[1], interval, row[3], row[4]))
+    return jobs
+
+
+class Scheduler(mxnet.Scheduler):
+    # Runs the jobs on a shared pool of workers and a shared session, the
+    # items scheduled are (job, run, row) of every device of a run
+    def __init__(self, jobs, username, password, use_ssl=False,
+                 timeout=TIMEOUT, workers=mxnet.WORKERS, jitter=JITTER,
+                 resultdir=RESULTDIR, policy=None, shard=None):
+        super().__init__(workers, policy)
+        self.jobs = jobs
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.jitter = jitter
+        self.resultdir = resultdir
+        self.shard = shard
+        self.session = mxnet.new_session(username, password, pool=workers)
+
+    def run_device(self, job, run, row):
+        # performs a job on a single device, returns a result record
+        ipaddr = row[0]
+        record = {'IP': ipaddr, 'job': job.name, 'start': run['stamp'],
+                  'latency_ms': '', 'result': '', 'error': ''}
+        start = time.time()
+        try:
+            if job.jobtype == 'backup':
+                result = mxbackup.backup_device(
+                    ipaddr, self.username, self.password, self.use_ssl,
+                    self.timeout, self.session, run['stamp'])
+                record['result'] = result['file']
+            elif job.jobtype == 'miccheck':
+                (error, state) = mxmic.get_profile(
+                    self.session, ipaddr, 'env', 'MI', self.use_ssl,
+                    self.timeout)
+                result = {'error': error or ''}
+                record['result'] = state or ''
+            else:
+                result = mxapi.send_commands(
+                    row, job.devicelist[0], [job.argument], self.username,
+                    self.password, self.use_ssl, self.timeout,
+                    session=self.session)[-1]
+                record['result'] = result['status']
+            record['error'] = result['error']
+        except Exception as e:
+            record['error'] = str(e)
+        record['latency_ms'] = round(1000 * (time.time() - start))
+        return record
+
+    def start_run(self, job, now):
+        # queues all devices of a job, spread over the jitter period
+        try:
+            rows = [row for row in job.devices()
+                    if mxnet.in_shard(row[0], self.shard)]
+        except IOError:
+            print("Job %s: Unable to read devicelist %s"
+                  % (job.name, job.listfile))
+            return
+        if not rows:
+            return
+        started = datetime.datetime.fromtimestamp(now)
+        stamp = started.strftime("%y%m%d-%H%M")
+        resultfile = os.path.join(self.resultdir, mxnet.shard_filename(
+            job.name + '_' + started.strftime("%y%m%d-%H%M%S") + '.jsonl',
+            self.shard))
+        try:
+            writer = mxnet.ResultWriter(resultfile, FIELDNAMES)
+        except IOError as e:
+            print("%s Job %s skipped: Unable to write result file %s (%s)"
+                  % (stamp, job.name, resultfile, e))
+            return
+        run = {'stamp': stamp, 'pending': len(rows), 'failed': 0,
+               'writer': writer}
+        job.running = True
+        print("%s Job %s started for %d devices"
+              % (stamp, job.name, len(rows)))
+        spread = min(self.jitter, job.interval)
+        for row in rows:
+            self.schedule(now + random.uniform(0, spread), (job, run, row))
+
+    def group(self, item):
+        (job, run, row) = item
+        if self.policy is None:
+            return None
+        return self.policy.group(row, job.devicelist[0])
+
+    def work(self, item):
+        return self.run_device(*item)
+
+    def failure(self, item, error):
+        (job, run, row) = item
+        return {'IP': row[0], 'job': job.name, 'start': run['stamp'],
+                'latency_ms': '', 'result': '', 'error': str(error)}
+
+    def done(self, item, record):
+        (job, run, row) = item
+        run['writer'].write(record)
+        if record['error']:
+            run['failed'] += 1
+        run['pending'] -= 1
+        if run['pending'] == 0:
+            run['writer'].close()
+            job.running = False
+            print("%s Job %s done, %d failed"
+                  % (datetime.datetime.now().strftime("%y%m%d-%H%M"),
+                     job.name, run['failed']))
+
+    def step(self):
+        # starts the jobs and devices that are due and handles the results
+        # that came in. Returns after at most a second.
+        now = time.time()
+        for job in self.jobs:
+            if now >= job.next_run:
+                while job.next_run <= now:
+                    job.next_run += job.interval
+                if job.running:
+                    job.coalesced += 1
+                    print("Job %s still running, run skipped (%d so far)"
+                          % (job.name, job.coalesced))
+                else:
+                    self.start_run(job, now)
+        super().step(min(job.next_run for job in self.jobs))
+
+    def run_forever(self):
+        try:
+            while True:
+                self.step()
+        finally:
+            self.close()
+            self.session.close()
+
+
+def main(argv=None):
+    print('MxDaemon ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", "--jobs", nargs=1, help="\
+                        specify CSV file with the job schedule")
+    parser.add_argument("-u", "--username", nargs=1, help="\
+                        specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1, help="\
+                        specify target device admin password")
+    parser.add_argument("-s", "--ssl", help="\
+                        use SSL to communicate (HTTPS)", action="store_true")
+    parser.add_argument("-t", "--timeout", nargs=1, help="\
+                        specify timeout in seconds (default = 10)")
+    parser.add_argument("-w", "--workers", nargs=1, help="\
+                        specify number of camera's handled at the same time \
+                        by all jobs together (default = 10)")
+    parser.add_argument("-i", "--jitter", nargs=1, help="\
+                        specify seconds over which the start of the devices \
+                        of a run is spread (default = 60)")
+    parser.add_argument("-r", "--resultdir", nargs=1, help="\
+                        specify directory for the results (default = results)")
+    mxnet.add_policy_arguments(parser)
+    mxnet.add_shard_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if args.jobs is None:
+        print("The program requires a job schedule! (-j [file])")
+        sys.exit()
+
+    if not os.path.exists(args.jobs[0]):
+        print("The job schedule '%s' does not exist in the current directory!"
+              % (args.jobs[0]))
+        sys.exit()
+
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
+    else:
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    try:
+        timeout = TIMEOUT
+        if args.timeout:
+            timeout = int(args.timeout[0])
+        workers = mxnet.WORKERS
+        if args.workers:
+            workers = int(args.workers[0])
+        jitter = JITTER
+        if args.jitter:
+            jitter = int(args.jitter[0])
+    except ValueError:
+        print("Unable to understand timeout, workers or jitter value")
+        print("Try an interger")
+        sys.exit()
+
+    if args.resultdir:
+        resultdir = args.resultdir[0]
+    else:
+        resultdir = RESULTDIR
+    os.makedirs(resultdir, exist_ok=True)
+
+    try:
+        jobs = read_jobs(args.jobs[0])
+    except ValueError as e:
+        print("Error in job schedule: " + str(e))
+        sys.exit()
+
+    if not jobs:
+        print("No jobs found in " + args.jobs[0])
+        sys.exit()
+
+    policy = mxnet.policy_from_args(args)
+    shard = mxnet.shard_from_args(args)
+
+    print('Starting %d jobs, press Ctrl+C to stop' % (len(jobs)))
+    scheduler = Scheduler(jobs, username, password, bool(args.ssl), timeout,
+                          workers, jitter, resultdir, policy, shard)
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("Stopping...")
+    if policy:
+        policy.close()
+    print("Done.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# ****************************************************************************
+# * mxdrift.py
+# * Report configuration drift of a list of Mobotix cfg files
+#
+# Compares every config section of all backup files in the current directory
+# (and optionally its subdirectories and zip and tar archives) with a
+# reference (golden) cfg file. Camera's with identical sections are
+# grouped and only the sections and camera's that differ are reported.
+# Section hashes are cached per file so only new or changed backups are read.
+#
+# usage:
+# python mxdrift.py [options]
+# use option -h or --help for instructions
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import os
+import sys
+import argparse
+import time
+import csv
+import hashlib
+import mxcfg
+import mxnet
+
+
+RELEASE = '1.0 - 19-10-2026'
+CACHEFILE = 'mxdrift.cache'
+OUTFILE = 'drift.csv'
+
+
+def section_hashes(cfgfile, open_cfg=None):
+    # hash of every section of a cfg file
+    # open_cfg opens the CfgFile of an archive member
+    hashes = {}
+    if open_cfg is None:
+        open_cfg = lambda: mxcfg.CfgFile(cfgfile)
+    with open_cfg() as cfg:
+        for name in cfg.sections():
+            data = cfg.section_bytes(name).replace(b'\r\n', b'\n')
+            hashes[name] = hashlib.sha1(data).hexdigest()
+    return hashes
+
+
+def cached_hashes(cfgfile, cache, stamp=None, open_cfg=None):
+    # section hashes from the cache as long as the file did not change
+    # stamp is [size, mtime] of the file (or archive member)
+    if stamp is None:
+        stat = os.stat(cfgfile)
+        stamp = [stat.st_size, stat.st_mtime]
+    entry = cache.get(cfgfile)
+    if entry is None or entry[0] != stamp:
+        entry = [stamp, section_hashes(cfgfile, open_cfg)]
+        cache[cfgfile] = entry
+    return entry[1]
+
+
+def compare(reference, files, exclude=(), cache=None):
+    # compares the sections of all files with the reference cfg file
+    # files are names or (name, stamp, open) of mxcfg.walk_cfgfiles
+    # returns (section hashes of the reference, drift, unreadable files)
+    # where drift[section][hash] is the list of files having that version
+    # of a differing section. Hash None means the section is missing.
+    if cache is None:
+        cache = {}
+    refhashes = section_hashes(reference)
+    drift = {}
+    unreadable = []
+    for f in files:
+        (f, stamp, open_cfg) = f if isinstance(f, tuple) else (f, None, None)
+        try:
+            hashes = cached_hashes(f, cache, stamp, open_cfg)
+        except IOError:
+            unreadable.append(f)
+            continue
+        for name in set(refhashes) | set(hashes):
+            if name in exclude or hashes.get(name) == refhashes.get(name):
+                continue
+            drift.setdefault(name, {}).setdefault(hashes.get(name), []).append(f)
+    return refhashes, drift, unreadable
+
+
+def main(argv=None):
+    start = time.time()
+
+    print('mxdrift ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-r", "--reference", nargs=1, help="\
+                        specify reference (golden) cfg file")
+    parser.add_argument("-e", "--extension", nargs=1, help="\
+                        specify source extension (default .cfg)")
+    parser.add_argument("-R", "--recursive", help="\
+                        also compare the files in subdirectories",
+                        action="store_true")
+    parser.add_argument("-a", "--archives", help="\
+                        also compare the files inside .zip, .tar and .tar.gz \
+                        archives", action="store_true")
+    parser.add_argument("-x", "--exclude", action="append", help="\
+                        section to leave out of the comparison (may be repeated)")
+    parser.add_argument("-o", "--output", nargs=1, help="\
+                        specify drift report file (default drift.csv)")
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if args.reference is None:
+        print("The program requires a reference cfg file! (-r [file])")
+        sys.exit()
+
+    if not os.path.exists(args.reference[0]):
+        print("The reference file '%s' does not exist!" % (args.reference[0]))
+        sys.exit()
+
+    if (args.extension) is None:
+        print("Source files extension .cfg is assumed")
+        source_ext = ".cfg"
+    else:
+        print("Only processing ", args.extension[0], " files")
+        source_ext = args.extension[0]
+
+    if args.output:
+        outfilename = args.output[0]
+    else:
+        outfilename = OUTFILE
+
+    exclude = set(args.exclude or [])
+    reference = os.path.abspath(args.reference[0])
+
+    print('Start comparing Mobotix config files with ' + reference)
+
+    cache = mxnet.read_cache(CACHEFILE)
+    found = []
+
+    def find_files():
+        # files are compared as they are found, archive members can only be
+        # read while walking the archive
+        for f in mxcfg.walk_cfgfiles(source_ext, None, args.recursive,
+                                     args.archives):
+            if f[0] != reference:
+                found.append(f[0])
+                yield f
+
+    (refhashes, drift, unreadable) = compare(reference, find_files(), exclude,
+                                             cache)
+    for f in unreadable:
+        print("Unable to read", f)
+    nr_of_files = len(found) - len(unreadable)
+    mxnet.write_cache(CACHEFILE, cache)
+
+    # Report the differing sections, grouping camera's with identical sections
+    with open(outfilename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['section', 'group', 'state', 'file'])
+        for name in sorted(drift):
+            groups = sorted(drift[name].items(), key=lambda g: -len(g[1]))
+            print("Section %s differs in %d files (%d variants)"
+                  % (name, sum(len(g[1]) for g in groups), len(groups)))
+            for (groupnr, (hash, files)) in enumerate(groups, 1):
+                if hash is None:
+                    state = 'missing'
+                elif name not in refhashes:
+                    state = 'extra'
+                else:
+                    state = 'differs'
+                print("   %d: %s in %d files" % (groupnr, state, len(files)))
+                for f in sorted(files):
+                    writer.writerow([name, groupnr, state, f])
+
+    if drift:
+        print("Drift report " + outfilename + " created successfully!")
+    else:
+        print("All files match the reference.")
+
+    print("")
+    end = time.time()
+    exectime = round(1000*(end-start))
+    print("Compared ", nr_of_files, " files in ", exectime, " milliseconds.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+# ****************************************************************************
+# * mxmerge.py
+# * Combine the partial outputs of sharded runs
+#
+# Tools started with --shard i/N handle part of the devices and write their
+# output as <name>.<i>of<N>.<ext>, like mic_on.2of4.csv. This script
+# combines those partial files into the output a single run would have
+# made, so a large estate can be handled by several hosts sharing files.
+#   .csv           rows of all parts below one header (; or , separated)
+#   .jsonl .json   records of all parts
+#   .cache .state  the entries of all parts (the most recent one wins)
+#   .db            the rows of all parts (mxtract --sqlite databases)
+#
+# usage:
+# python mxmerge.py [options] <output>
+# use option -h or --help for instructions
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import os
+import sys
+import argparse
+import csv
+import glob
+import json
+import re
+import time
+
+
+RELEASE = '1.0 - 19-10-2026'
+
+
+def find_parts(output):
+    # partial files of output like mic_on.1of4.csv .. mic_on.4of4.csv
+    # returns (parts sorted by shard, numbers of the missing shards)
+    (root, ext) = os.path.splitext(output)
+    part_re = re.compile(re.escape(root) + r'\.(\d+)of(\d+)' + re.escape(ext)
+                         + '$')
+    parts = {}
+    total = 0
+    for filename in glob.glob(glob.escape(root) + '.*of*' + glob.escape(ext)):
+        m = part_re.match(filename)
+        if m:
+            parts[int(m.group(1))] = filename
+            total = max(total, int(m.group(2)))
+    missing = [i for i in range(1, total + 1) if i not in parts]
+    return [parts[i] for i in sorted(parts)], missing
+
+
+def merge_csv(output, parts):
+    # the columns of all parts in order of appearance (parts of mxtract
+    # may have extra columns), the separator and line end of the first part
+    with open(parts[0], 'r', newline='') as f:
+        first = f.readline()
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    lineterminator = '\r\n' if first.endswith('\r\n') else '\n'
+    fieldnames = []
+    for part in parts:
+        with open(part, 'r', newline='') as f:
+            header = next(csv.reader(f, delimiter=delimiter), [])
+        fieldnames.extend(name for name in header if name not in fieldnames)
+    nr_of_rows = 0
+    with open(output, 'w', newline='') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames,
+                                delimiter=delimiter,
+                                lineterminator=lineterminator)
+        writer.writeheader()
+        for part in parts:
+            with open(part, 'r', newline='') as f:
+                for row in csv.DictReader(f, delimiter=delimiter):
+                    writer.writerow(row)
+                    nr_of_rows += 1
+    return nr_of_rows
+
+
+def merge_jsonl(output, parts):
+    nr_of_rows = 0
+    with open(output, 'w') as outfile:
+        for part in parts:
+            with open(part, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        outfile.write(line if line.endswith('\n')
+                                      else line + '\n')
+                        nr_of_rows += 1
+    return nr_of_rows
+
+
+def merge_dict(output, parts):
+    # cache and state files are JSON objects by IP. Entries with a time
+    # (mxcensus.cache) keep the most recent one, others the last part.
+    # A part that can't be read is reported and left out.
+    merged = {}
+    for part in parts:
+        try:
+            with open(part, 'r') as f:
+                entries = json.load(f)
+            if not isinstance(entries, dict):
+                raise ValueError('not a JSON object')
+        except (IOError, ValueError) as e:
+            print("Warning: Unable to read part %s (%s), skipped" % (part, e))
+            continue
+        for (key, entry) in entries.items():
+            old = merged.get(key)
+            if isinstance(old, dict) and isinstance(entry, dict) and \
+                    old.get('time', 0) > entry.get('time', 0):
+                continue
+            merged[key] = entry
+    with open(output, 'w') as outfile:
+        json.dump(merged, outfile)
+    return len(merged)
+
+
+def merge_db(output, parts):
+    import sqlite3
+    import mxtract
+    db = mxtract.open_db(output)
+    columns = mxtract.db_columns(db)
+    nr_of_rows = 0
+    for part in parts:
+        src = sqlite3.connect(part)
+        cursor = src.execute('SELECT * FROM smartsensor')
+        names = [d[0] for d in cursor.description]
+        for row in cursor:
+            ssd = {name: value for (name, value) in zip(names, row)
+                   if value is not None}
+            mxtract.upsert_ssd(db, ssd, columns)
+            nr_of_rows += 1
+        src.close()
+    db.commit()
+    db.close()
+    return nr_of_rows
+
+
+def merge(output, parts):
+    # combines the parts into output, returns the number of rows (entries)
+    ext = os.path.splitext(output)[1].lower()
+    if ext in ('.jsonl', '.json'):
+        return merge_jsonl(output, parts)
+    if ext in ('.cache', '.state'):
+        return merge_dict(output, parts)
+    if ext == '.db':
+        if os.path.exists(output):
+            os.remove(output)
+        return merge_db(output, parts)
+    return merge_csv(output, parts)
+
+
+def main(argv=None):
+    start = time.time()
+
+    print('mxmerge ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("output", help="\
+                        output to make from its parts like mic_on.csv \
+                        (combines mic_on.1ofN.csv .. mic_on.NofN.csv)")
+    parser.add_argument("-i", "--input", action="append", help="\
+                        specify a part to combine instead of searching them \
+                        (may be repeated)")
+    parser.add_argument("-f", "--force", help="\
+                        combine the parts found even when parts are missing",
+                        action="store_true")
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if args.input:
+        parts = args.input
+        for part in parts:
+            if not os.path.exists(part):
+                print("The part '%s' does not exist!" % (part))
+                sys.exit()
+    else:
+        (parts, missing) = find_parts(args.output)
+        if not parts:
+            print("No parts of %s found" % (args.output))
+            sys.exit()
+        if missing:
+            print("Missing shard(s) %s of %s"
+                  % (', '.join(str(i) for i in missing), args.output))
+            if not args.force:
+                print("Use -f or --force to combine the parts found anyway")
+                sys.exit()
+
+    for part in parts:
+        print("Combining: ", part)
+    nr_of_rows = merge(args.output, parts)
+
+    print("")
+    end = time.time()
+    exectime = round(1000*(end-start))
+    print("Combined ", len(parts), " parts (", nr_of_rows, " rows) into ",
+          args.output, " in ", exectime, " milliseconds.")
+
+
+if __name__ == '__main__':
+    main()
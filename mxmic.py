@@ -5,8 +5,9 @@ of geef de lijst IP adressen van alle camera's waar MI event aan staat
 aan:    -micon
 uit:    -micoff
 Check:  -miccheck
+Algemeen: -e <sectie>:<profiel>=on|off|check  (bv. -e ima:VM1=off -e met:Bell2=on)
 
-API commando's:  
+API commando's:
 Uitschakelen:
 http://<IP>/control/control?section=event_env&set_profile=env:MI&_profilestate=i
 Inschakelen:
@@ -18,174 +19,468 @@ http://<IP>/control/control?section=event_env&read_profile=env:MI
 
 # ****************************************************************************
 # * mxmic.py
-# * Mobotix api sender
+# * Mobotix event profile switcher
 #
-# This script sends http api comands to (multiple) mobotix camera's 
+# This script switches event profiles of (multiple) mobotix camera's on or
+# off or checks their state
 # usage:
-# python mxapi.py [options] 
+# python mxmic.py [options]
 # use option -h or --help for instructions
+# With --watch the checked profiles are polled continuously: camera's that
+# changed recently are polled often, stable camera's less and less often.
+# Only the changes are reported, as events in mic_events.jsonl, while the
+# checkfile always lists the camera's with an active profile.
+# The checkfile (mic_on.csv) of -miccheck lists the IP addresses only, like
+# it always did. With -e ...=check operations it is a ; separated CSV with
+# a column holding the state (active/inactive) of every checked profile.
+# The operations can also be used from other python code:
+#   import mxmic
+#   record = mxmic.apply_operations('192.168.1.24', [('env', 'MI', 'off')],
+#                                   'admin', 'meinsm')
 #
 # release info
 # 1.0 first release 140520 Paul Merkx
+# 1.1 generalised to any section:profile=state operation, camera's are
+#     handled concurrently, operations available as importable functions,
+#     watch mode
 # ****************************************************************************
 import os
-import requests
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
 import sys
 import argparse
 import csv
 import io
+import time
+import datetime
+import random
+import mxnet
 
-RELEASE = '1.0 - 31-12-2024'
+RELEASE = '1.1 - 19-10-2026'
 TIMEOUT = 3   # requests timeout
-
-        
-def validate_ip(s):
-    a = s.split('.')
-    if len(a) != 4:
-        return False
-    for x in a:
-        if not x.isdigit():
-            return False
-        i = int(x)
-        if i < 0 or i > 255:
-            return False
-    return True
+CHECKFILE = 'mic_on.csv'
+STATES = ('on', 'off', 'check')
+WATCH_MIN = 10  # seconds between polls of a camera that just changed
+WATCH_MAX = 300  # maximum seconds between polls of a stable camera
+WATCH_GROW = 1.5  # the interval grows by this factor after every unchanged poll
+EVENTFILE = 'mic_events.jsonl'
+EVENT_FIELDS = ['time', 'IP', 'profile', 'from', 'to', 'error']
+UNREACHABLE = 'unreachable'  # state of the profiles of a failing camera
 
 
 def check_one_parameter(var1, var2, var3):
     return sum([bool(var1), bool(var2), bool(var3)]) == 1
-    
-
-# ***************************************************************
-# *** Main program ***
-# ***************************************************************
-print('MxProgram ' + RELEASE + ' by (c) Simac Healthcare.')
-print('Disclaimer: ')
-print('USE THIS SOFTWARE AT YOUR OWN RISK')
-print(' ')
-
-# *** Read arguments passed on commandline
-parser = argparse.ArgumentParser()
-parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target device IP when programming a single camera")
-parser.add_argument("-l", "--devicelist", nargs=1, help="specify target device list in CSV when programming multiple camera's")
-parser.add_argument("-micon", "--micon", help="Switches MI event on for target devices", action="store_true")
-parser.add_argument("-micoff", "--micoff", help="Switches MI event off for target devices and saves IP list.", action="store_true")
-parser.add_argument("-miccheck", "--miccheck", help="Check status of MI event for target devices and saves enabled MI in IP list.", action="store_true")
-parser.add_argument("-u", "--username", nargs=1, help="specify target device admin username")
-parser.add_argument("-p", "--password", nargs=1, help="specify target device admin password")
-parser.add_argument("-s", "--ssl", help="use SSL to communicate (HTTPS)", action="store_true")
-parser.add_argument("-t", "--timeout", nargs=1, help="specify cUrl timeout in seconds (default = 60)")
-
-args = parser.parse_args()
-
-# *** Check validity of the arguments
-if (args.deviceIP is None and args.devicelist is None) or (args.deviceIP and args.devicelist):
-    print("Either deviceIP or devicelist is required")
-    sys.exit() 
-
-if not check_one_parameter(args.micon, args.micoff, args.miccheck):
-    print("Either one of -micon or -micoff or -miccheck is required")
-    sys.exit() 
-
-if args.username is None:
-    print("Default Admin account assumed")
-    username = 'admin'
-else:
-    username = args.username[0]
- 
-if args.password is None:
-    print("Default Admin password assumed")
-    password = 'meinsm'
-else:
-    password = args.password[0]
-
-if args.timeout:
+
+
+def parse_operation(op):
+    # 'section:profile=state' like 'env:MI=off' into (section, profile, state)
+    # returns None when the operation can not be understood
+    target, sep, state = op.partition('=')
+    section, sep2, profile = target.partition(':')
+    if not sep or not sep2 or not section or not profile:
+        return None
+    state = state.lower()
+    if state not in STATES:
+        return None
+    if section.startswith('event_'):
+        section = section[len('event_'):]
+    return section, profile, state
+
+
+def operation_cmd(section, profile, state):
+    # the control API handles a single profile per request
+    cmd = '/control/control?section=event_' + section
+    if state == 'check':
+        return cmd + '&read_profile=' + section + ':' + profile
+    cmd = cmd + '&set_profile=' + section + ':' + profile + '&_profilestate='
+    if state == 'off':
+        cmd = cmd + 'i'
+    return cmd
+
+
+def profile_request(session, ipaddr, section, profile, state,
+                    use_ssl=False, timeout=TIMEOUT):
+    # performs a single operation on a camera
+    # returns (None, state of the profile for check operations) or
+    # (reason of failure, None)
+    import requests
+    url = mxnet.base_url(ipaddr, use_ssl) + \
+        operation_cmd(section, profile, state)
+    try:
+        r = session.get(url, timeout=timeout)
+        r.raise_for_status()
+    except requests.exceptions.HTTPError as errh:
+        return "Http Error: " + str(errh), None
+    except requests.exceptions.ConnectionError as errc:
+        return "Error Connecting: " + str(errc), None
+    except requests.exceptions.Timeout as errt:
+        return "Timeout Error: " + str(errt), None
+    except requests.exceptions.RequestException as err:
+        return "Something weird happened " + str(err), None
+    if state != 'check':
+        return None, None
+    if "_profilestate=i" in r.text:
+        return None, 'inactive'
+    return None, 'active'
+
+
+def get_profile(session, ipaddr, section, profile, use_ssl=False,
+                timeout=TIMEOUT):
+    return profile_request(session, ipaddr, section, profile, 'check',
+                           use_ssl, timeout)
+
+
+def set_profile(session, ipaddr, section, profile, on, use_ssl=False,
+                timeout=TIMEOUT):
+    if on:
+        state = 'on'
+    else:
+        state = 'off'
+    return profile_request(session, ipaddr, section, profile, state,
+                           use_ssl, timeout)[0]
+
+
+def apply_operations(ipaddr, operations, username, password, use_ssl=False,
+                     timeout=TIMEOUT, session=None):
+    # runs all operations on one camera over a single kept-alive session
+    # returns a record with the IP, the states of the checked profiles
+    # ({'env:MI': 'active'}) and an error ('' when all succeeded)
+    if session is None:
+        with mxnet.new_session(username, password) as session:
+            return apply_operations(ipaddr, operations, username, password,
+                                    use_ssl, timeout, session)
+    record = {'IP': ipaddr, 'states': {}, 'error': ''}
+    for (section, profile, state) in operations:
+        (error, profilestate) = profile_request(session, ipaddr, section,
+                                                profile, state, use_ssl,
+                                                timeout)
+        if error:
+            record['error'] = error
+            break
+        if profilestate:
+            record['states'][section + ':' + profile] = profilestate
+    return record
+
+
+def write_checkfile(checkfile, checked, states):
+    # writes the camera's with an active checked profile, states is
+    # {IP: {'env:MI': 'active', ...}}, checked the profiles written as
+    # columns. Written next to the checkfile first so readers never see
+    # half a file.
+    with open(checkfile + '.tmp', 'w', newline='') as outfile:
+        writer = csv.writer(outfile, dialect='semicolons',
+                            lineterminator='\n')
+        writer.writerow(['IP'] + checked)
+        for (ipaddr, profiles) in states.items():
+            if 'active' in profiles.values():
+                writer.writerow([ipaddr] + [profiles.get(p, '')
+                                            for p in checked])
+    os.replace(checkfile + '.tmp', checkfile)
+
+
+class Watcher(mxnet.Scheduler):
+    # Polls the checked profiles of camera's over and over again on a shared
+    # pool of workers and reports the changes only. Every camera has its own
+    # interval: after a change it is set to minimum, after every poll
+    # without a change it grows by WATCH_GROW up to maximum. The states are
+    # kept in memory, report(event) is called for every change (and for the
+    # first state of every camera).
+    def __init__(self, rows, header, operations, session, use_ssl=False,
+                 timeout=TIMEOUT, workers=mxnet.WORKERS, policy=None,
+                 minimum=WATCH_MIN, maximum=WATCH_MAX, report=None):
+        super().__init__(workers, policy)
+        self.header = header
+        self.operations = operations
+        self.checked = [section + ':' + profile
+                        for (section, profile, state) in operations]
+        self.session = session
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.minimum = minimum
+        self.maximum = maximum
+        self.report = report
+        self.states = {}  # IP -> {profile: state}
+        self.intervals = {}  # IP -> seconds until the next poll
+        self.changed = False  # states changed since the last call of changes
+        # the first polls are spread over the minimum interval
+        now = time.time()
+        for row in rows:
+            self.intervals[row[0]] = minimum
+            self.schedule(now + random.uniform(0, minimum), row)
+
+    def work(self, row):
+        return apply_operations(row[0], self.operations, None, None,
+                                self.use_ssl, self.timeout, self.session)
+
+    def failure(self, row, error):
+        return {'IP': row[0], 'states': {}, 'error': str(error)}
+
+    def group(self, row):
+        if self.policy is None:
+            return None
+        return self.policy.group(row, self.header)
+
+    def done(self, row, record):
+        ipaddr = row[0]
+        if record['error']:
+            new = {profile: UNREACHABLE for profile in self.checked}
+        else:
+            new = record['states']
+        old = self.states.get(ipaddr, {})
+        stamp = datetime.datetime.now().isoformat(timespec='seconds')
+        changed = False
+        for profile in self.checked:
+            if new.get(profile) == old.get(profile):
+                continue
+            changed = True
+            if self.report:
+                self.report({'time': stamp, 'IP': ipaddr, 'profile': profile,
+                             'from': old.get(profile, ''),
+                             'to': new.get(profile, ''),
+                             'error': record['error']})
+        self.states[ipaddr] = new
+        if changed:
+            self.changed = True
+            interval = self.minimum
+        else:
+            interval = min(self.intervals[ipaddr] * WATCH_GROW, self.maximum)
+        self.intervals[ipaddr] = interval
+        self.schedule(time.time() + interval, row)
+
+    def changes(self):
+        # True once after the states changed
+        (changed, self.changed) = (self.changed, False)
+        return changed
+
+
+def watch(rows, header, operations, username, password, use_ssl, timeout,
+          workers, policy, minimum, maximum, checkfile, eventfile,
+          columns):
+    # runs a Watcher until Ctrl+C, changes go to the eventfile and the
+    # checkfile is rewritten whenever a camera changed
     try:
-        TIMEOUT = int(args.timeout[0])
-    except:
-        print("Unable to understand timeout value of " + args.timeout[0])
-        print("Try an interger")
+        events = mxnet.ResultWriter(eventfile, EVENT_FIELDS)
+    except IOError:
+        print("Error: Unable to write output file " + eventfile)
         sys.exit()
-        
-if args.deviceIP:
-    if not validate_ip(args.deviceIP[0]):
-        print("The device %s is not a valid IPv4 address!" % (args.deviceIP[0]))
+
+    def report(event):
+        events.write(event)
+        print('%s Device %s %s %s -> %s %s'
+              % (event['time'], event['IP'], event['profile'],
+                 event['from'] or '?', event['to'], event['error']))
+
+    session = mxnet.new_session(username, password, pool=workers)
+    watcher = Watcher(rows, header, operations, session, use_ssl, timeout,
+                      workers, policy, minimum, maximum, report)
+    print("Watching %d camera's, press Ctrl+C to stop" % (len(rows)))
+    try:
+        while True:
+            watcher.step()
+            if watcher.changes():
+                write_checkfile(checkfile, columns, watcher.states)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        watcher.close()
+        session.close()
+        events.close()
+        write_checkfile(checkfile, columns, watcher.states)
+
+
+def main(argv=None):
+    print('MxMic ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target device IP when programming a single camera")
+    parser.add_argument("-l", "--devicelist", nargs=1, help="specify target device list in CSV when programming multiple camera's")
+    parser.add_argument("-micon", "--micon", help="Switches MI event on for target devices", action="store_true")
+    parser.add_argument("-micoff", "--micoff", help="Switches MI event off for target devices and saves IP list.", action="store_true")
+    parser.add_argument("-miccheck", "--miccheck", help="Check status of MI event for target devices and saves enabled MI in IP list.", action="store_true")
+    parser.add_argument("-e", "--event", action="append", help="section:profile=on|off|check like ima:VM1=off (may be repeated)")
+    parser.add_argument("-c", "--checkfile", nargs=1, help="specify file listing devices with an active checked profile (default = mic_on.csv)")
+    parser.add_argument("-u", "--username", nargs=1, help="specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1, help="specify target device admin password")
+    parser.add_argument("-s", "--ssl", help="use SSL to communicate (HTTPS)", action="store_true")
+    parser.add_argument("-t", "--timeout", nargs=1, help="specify cUrl timeout in seconds (default = 3)")
+    parser.add_argument("-w", "--workers", nargs=1, help="specify number of camera's handled at the same time (default = 10)")
+    parser.add_argument("--watch", help="keep checking the profiles and only report changes (stop with Ctrl+C)", action="store_true")
+    parser.add_argument("--interval", nargs=2, help="specify minimum and maximum seconds between the checks of a camera when watching (default = 10 300)")
+    parser.add_argument("-o", "--output", nargs=1, help="specify file the changes are written to when watching, .jsonl or .csv (default = mic_events.jsonl)")
+    mxnet.add_policy_arguments(parser)
+    mxnet.add_shard_argument(parser)
+    mxnet.add_progress_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if (args.deviceIP is None and args.devicelist is None) or (args.deviceIP and args.devicelist):
+        print("Either deviceIP or devicelist is required")
         sys.exit()
 
-if args.devicelist:
-    if not os.path.exists(args.devicelist[0]):
-        print("The devicelist '%s' does not exist in the current directory!" % (args.devicelist[0]))
+    if args.event:
+        if args.micon or args.micoff or args.miccheck:
+            print("Use either -e or one of -micon, -micoff or -miccheck")
+            sys.exit()
+    elif not check_one_parameter(args.micon, args.micoff, args.miccheck):
+        print("Either one of -micon or -micoff or -miccheck (or -e) is required")
         sys.exit()
 
-if args.micoff:
-    api_cmd = "/control/control?section=event_env&set_profile=env:MI&_profilestate=i"
-    
-if args.micon:
-    api_cmd = "/control/control?section=event_env&set_profile=env:MI&_profilestate=" 
-
-if args.miccheck:
-    api_cmd = "/control/control?section=event_env&read_profile=env:MI"   
-    
-if args.ssl:
-    use_ssl = True
-else:
-    use_ssl = False
-
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-    
-print('Starting')
-print('Build devicelist...')
-
-# Build devicelist from devicelist file or from single parameter
-# devicelist is a list of lists
-devicelist = []
-if args.devicelist:
-    csv.register_dialect('semicolons', delimiter=';')
-    with open(args.devicelist[0], 'r') as f:
-        reader = csv.reader(f, dialect='semicolons')
-        for row in reader:
-            devicelist.append(row)
-else:
-    devicelist.append(['IP'])
-    devicelist.append([args.deviceIP[0]])
-#devicelist[0] now contains the header
-
-if args.miccheck:
-    try:
-        with open("mic_on.csv", 'w') as outfile:
-            outfile.write("IP\n")
-    except IOError:
-        print("Error: Unable to write output file")
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
+    else:
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    timeout = TIMEOUT
+    if args.timeout:
+        try:
+            timeout = int(args.timeout[0])
+        except:
+            print("Unable to understand timeout value of " + args.timeout[0])
+            print("Try an interger")
+            sys.exit()
+
+    workers = mxnet.WORKERS
+    if args.workers:
+        try:
+            workers = int(args.workers[0])
+        except:
+            print("Unable to understand workers value of " + args.workers[0])
+            print("Try an interger")
+            sys.exit()
+
+    (minimum, maximum) = (WATCH_MIN, WATCH_MAX)
+    if args.interval:
+        try:
+            (minimum, maximum) = (float(args.interval[0]),
+                                  float(args.interval[1]))
+        except ValueError:
+            print("Unable to understand interval values " +
+                  " ".join(args.interval))
+            print("Try a number of seconds")
+            sys.exit()
+        if minimum <= 0 or maximum < minimum:
+            print("The maximum interval should be at least the minimum")
+            sys.exit()
+
+    if args.deviceIP:
+        if not mxnet.validate_ip(args.deviceIP[0]):
+            print("The device %s is not a valid IPv4 address!" % (args.deviceIP[0]))
+            sys.exit()
+
+    if args.devicelist:
+        if not os.path.exists(args.devicelist[0]):
+            print("The devicelist '%s' does not exist in the current directory!" % (args.devicelist[0]))
+            sys.exit()
+
+    # the shortcuts keep the checkfile a plain list of IP addresses
+    shortcut = args.micon or args.micoff or args.miccheck
+
+    if args.micoff:
+        args.event = ['env:MI=off']
+
+    if args.micon:
+        args.event = ['env:MI=on']
+
+    if args.miccheck:
+        args.event = ['env:MI=check']
+
+    # Build the list of operations, an operation given twice is sent once
+    operations = []
+    for op in args.event:
+        operation = parse_operation(op)
+        if operation is None:
+            print("Unable to understand operation '%s'" % (op))
+            print("Use section:profile=state like env:MI=off, state is one of " +
+                  ", ".join(STATES))
+            sys.exit()
+        if operation not in operations:
+            operations.append(operation)
+    checked = [section + ':' + profile
+               for (section, profile, state) in operations if state == 'check']
+    if args.watch and len(checked) != len(operations):
+        print("Only check operations can be watched")
         sys.exit()
+    columns = [] if shortcut else checked
 
-for devicenr in range(1, len(devicelist)):  #skip header
-    #skip device if starts with comment
-    if devicelist[devicenr][0][0] != '#':
-        ipaddr = devicelist[devicenr][0]
-        print('About to program/read device ' + ipaddr + ' ', end='')
-        if use_ssl:
-            proto = "https://"
-        else:
-            proto = "http://"
+    if args.checkfile:
+        checkfile = args.checkfile[0]
+    else:
+        checkfile = CHECKFILE
+    shard = mxnet.shard_from_args(args)
+    checkfile = mxnet.shard_filename(checkfile, shard)
+    eventfile = EVENTFILE
+    if args.output:
+        eventfile = args.output[0]
+    eventfile = mxnet.shard_filename(eventfile, shard)
+
+    if args.ssl:
+        use_ssl = True
+    else:
+        use_ssl = False
+
+    print('Starting')
+    print('Build devicelist...')
+
+    devicelist = mxnet.read_devicelist(args.devicelist and args.devicelist[0],
+                                       args.deviceIP and args.deviceIP[0])
+    policy = mxnet.policy_from_args(args, devicelist[0])
+
+    if args.watch:
+        watch(list(mxnet.devices(devicelist, shard)), devicelist[0],
+              operations, username, password, use_ssl, timeout, workers,
+              policy, minimum, maximum, checkfile, eventfile, columns)
+        if policy:
+            policy.close()
+        print("Done.")
+        return
+
+    if checked:
         try:
-            r = requests.get(proto + ipaddr + api_cmd, auth=(username, password), timeout=TIMEOUT, verify=False)
-            r.raise_for_status()
-            if r.status_code == 200:
-                print('...OK')
-                if ("_profilestate=i" not in r.text) and args.miccheck:
-                    try:
-                        with open("mic_on.csv", 'a') as outfile:
-                            outfile.write(ipaddr + "\n")
-                    except IOError:
-                        print("Error: Unable to write output file. Aborted")
-                        sys.exit()
-        except requests.exceptions.HTTPError as errh:
-            print ("... Fail. Http Error:",errh)
-        except requests.exceptions.ConnectionError as errc:
-            print ("... Fail. Error Connecting:",errc)
-        except requests.exceptions.Timeout as errt:
-            print ("... Fail. Timeout Error:",errt)
-        except requests.exceptions.RequestException as err:
-            print ("... Fail. Something weird happened ",err)
-print("Done.")
\ No newline at end of file
+            outfile = open(checkfile, 'w', newline='')
+        except IOError:
+            print("Error: Unable to write output file")
+            sys.exit()
+        writer = csv.writer(outfile, dialect='semicolons',
+                            lineterminator='\n')
+        writer.writerow(['IP'] + columns)
+
+    def apply(row):
+        return apply_operations(row[0], operations, username, password,
+                                use_ssl, timeout)
+
+    rows = list(mxnet.devices(devicelist, shard))
+    progress = mxnet.Progress(len(rows), workers, args.progress)
+    for (row, record) in mxnet.run_pool(progress.track(apply), rows, workers,
+                                        policy):
+        ipaddr = record['IP']
+        states = record['states']
+        progress.finished(bool(record['error']))
+        if record['error']:
+            progress.print('Device ' + ipaddr + ' ... Fail. ' + record['error'])
+            continue
+        progress.print('Device ' + ipaddr + ' ...OK ' +
+                       ' '.join(p + '=' + s for (p, s) in states.items()))
+        if checked and 'active' in states.values():
+            writer.writerow([ipaddr] + [states[p] for p in columns])
+            outfile.flush()
+
+    progress.close()
+    if policy:
+        policy.close()
+    if checked:
+        outfile.close()
+    print("Done.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,946 @@
+# ****************************************************************************
+# * mxnet.py
+# * Shared network helpers for the Mobotix tools
+#
+# Holds the devicelist handling and a small bounded worker pool so the
+# tools can talk to a whole fleet of camera's at once instead of one
+# camera after the other.
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import os
+import sys
+import csv
+import json
+import socket
+import time
+import heapq
+import itertools
+import threading
+import mxcfg
+
+WORKERS = 10  # default number of camera's handled at the same time
+CHUNKSIZE = 64 * 1024  # bytes read at once from files that are uploaded
+RESOLVE_TTL = 300  # seconds the address of a devicename is used
+TIMESTAMP_CMD = '\nhelo\nview section timestamp\nquit\n\n'
+TIMESTAMP_CACHE = 'mxcensus.cache'  # SW versions found by mxcensus/mxrestore
+TIMESTAMP_TTL = 3600  # seconds a cached timestamp is used
+response_hooks = []  # added to every new session, see GroupPolicy, Progress
+auths = {}  # CameraAuth by (username, password), shared by all sessions
+resolved = {}  # devicename -> (time, addresses or failure), see resolve_devices
+
+csv.register_dialect('semicolons', delimiter=';')
+
+
+def validate_ip(s):
+    a = s.split('.')
+    if len(a) != 4:
+        return False
+    for x in a:
+        if not x.isdigit():
+            return False
+        i = int(x)
+        if i < 0 or i > 255:
+            return False
+    return True
+
+
+def read_devicelist(listfile, deviceIP):
+    # Build devicelist from devicelist file or from single parameter
+    # devicelist is a list of lists, devicelist[0] contains the header
+    devicelist = []
+    if listfile:
+        with open(listfile, 'r') as f:
+            reader = csv.reader(f, dialect='semicolons')
+            for row in reader:
+                devicelist.append(row)
+    else:
+        devicelist.append(['IP'])
+        devicelist.append([deviceIP])
+    return devicelist
+
+
+def devices(devicelist, shard=None):
+    # all device rows of a devicelist, skipping the header, empty lines
+    # and devices commented out with #
+    # with a shard (i, N) only the devices of part i of N
+    for row in devicelist[1:]:
+        if row and row[0] and row[0][0] != '#' and in_shard(row[0], shard):
+            yield row
+
+
+def device_host(name):
+    # host part of a device like cam01 of cam01:8080
+    return name.rpartition(':')[0] if ':' in name else name
+
+
+def resolve_host(host):
+    # looks up a devicename and caches the answer (or the failure)
+    try:
+        result = socket.getaddrinfo(host, None, 0, socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        result = socket.gaierror(str(e))
+    resolved[host] = (time.time(), result)
+    return result
+
+
+def resolved_address(host):
+    # first (preferred) address resolve_devices found for a devicename,
+    # looked up again after RESOLVE_TTL seconds. None for other hosts and
+    # for devicenames that could not be resolved (the connection reports
+    # those).
+    entry = resolved.get(host)
+    if entry is None:
+        return None
+    (stamp, result) = entry
+    if time.time() - stamp > RESOLVE_TTL:
+        result = resolve_host(host)
+    if isinstance(result, Exception) or not result:
+        return None
+    return result[0][4][0]
+
+
+def resolve_devices(rows, workers=WORKERS):
+    # Looks up the devicenames (not the IP addresses) of all rows at the
+    # same time before the first camera is contacted, instead of every
+    # request doing its own blocking lookup. The sessions of new_session
+    # connect to the addresses found for the rest of the run.
+    # Returns (rows that can be contacted, [(row, error)] of the rows with
+    # a devicename that can't be resolved).
+    hosts = []
+    for row in rows:
+        host = device_host(row[0]).lower()
+        if not validate_ip(host) and host not in hosts:
+            hosts.append(host)
+    if not hosts:
+        return rows, []
+    import concurrent.futures
+    print('Resolving %d devicenames...' % (len(hosts)))
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(workers, len(hosts))) as pool:
+        results = dict(zip(hosts, pool.map(resolve_host, hosts)))
+    found = []
+    failed = []
+    for row in rows:
+        host = device_host(row[0]).lower()
+        result = results.get(host)
+        if isinstance(result, Exception):
+            failed.append((row, 'Unable to resolve devicename %s (%s)'
+                           % (host, result)))
+        else:
+            found.append(row)
+    if failed:
+        print('%d of %d devicenames could not be resolved'
+              % (len({device_host(row[0]).lower() for (row, _) in failed}),
+                 len(hosts)))
+    return found, failed
+
+
+def in_shard(name, shard):
+    # Devices (or files) are divided over N shards by the md5 hash of their
+    # name, so every host running a shard gets the same devices every run
+    # whatever the order of the devicelist is.
+    if shard is None:
+        return True
+    import hashlib
+    digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+    return int(digest, 16) % shard[1] == shard[0] - 1
+
+
+def shard_filename(filename, shard):
+    # name of the partial output of a shard like mic_on.2of4.csv
+    if shard is None:
+        return filename
+    (root, ext) = os.path.splitext(filename)
+    return '%s.%dof%d%s' % (root, shard[0], shard[1], ext)
+
+
+def add_shard_argument(parser):
+    parser.add_argument("--shard", nargs=1, help="\
+                        only handle part i of N of the devices like 2/4, \
+                        output files get .2of4 in their name (combine them \
+                        with mxmerge.py)")
+
+
+def shard_from_args(args):
+    # (i, N) from the --shard option or None when not used
+    if not args.shard:
+        return None
+    try:
+        (i, n) = [int(x) for x in args.shard[0].split('/')]
+        if not 1 <= i <= n:
+            raise ValueError
+    except ValueError:
+        print("Unable to understand shard " + args.shard[0])
+        print("Try i/N like 2/4 where i is 1 to N")
+        sys.exit()
+    print('Handling shard %d of %d' % (i, n))
+    return (i, n)
+
+
+def labels(header, row):
+    # replacement dictionary of {LABEL} placeholders for one device row
+    replacedict = {}
+    for param in range(1, min(len(header), len(row))):
+        replacedict['{' + header[param] + '}'] = row[param]
+    return replacedict
+
+
+def replace_all(text, dic):
+    for i, j in dic.items():
+        text = text.replace(i, j)
+    return text
+
+
+def base_url(ipaddr, use_ssl):
+    if use_ssl:
+        return 'https://' + ipaddr
+    return 'http://' + ipaddr
+
+
+class CameraAuth:
+    # Authentication negotiated once per camera instead of on every request.
+    # Basic authentication is sent along with every request to a camera
+    # (no extra round trip for camera's accepting it). A camera answering
+    # with a Digest challenge instead gets the request again with Digest
+    # and is remembered in hosts, so its following requests carry Digest
+    # right away with the cached nonce and an incrementing nonce count until
+    # the camera sends a new nonce (stale or expired).
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.hosts = {}  # host:port -> scheme, realm, nonce, opaque, qop,
+        #                  algorithm and nonce count of the camera
+        self.lock = threading.Lock()
+
+    def __call__(self, r):
+        header = self.authorization(url_host(r.url), r.method, r.path_url)
+        if header:
+            r.headers['Authorization'] = header
+        r.register_hook('response', self.handle_401)
+        return r
+
+    def authorization(self, host, method, uri):
+        # Authorization header for a request to host, Basic unless the
+        # camera asked for Digest, None when the Digest challenge of the
+        # camera can't be answered
+        with self.lock:
+            known = self.hosts.get(host)
+            if known is None or known['scheme'] == 'basic':
+                import base64
+                credentials = '%s:%s' % (self.username, self.password)
+                return 'Basic ' + base64.b64encode(
+                    credentials.encode('latin1')).decode('ascii')
+            known['nc'] += 1
+            challenge = dict(known)
+        return self.digest_header(challenge, method, uri)
+
+    def digest_header(self, challenge, method, uri):
+        # Digest response (RFC 7616) to challenge for a request of uri
+        import hashlib
+        algorithm = (challenge['algorithm'] or 'MD5').upper()
+        hashname = {'MD5': 'md5', 'MD5-SESS': 'md5', 'SHA-256': 'sha256',
+                    'SHA-256-SESS': 'sha256'}.get(algorithm)
+        qop = [q.strip() for q in (challenge['qop'] or '').split(',')]
+        if hashname is None or (challenge['qop'] and 'auth' not in qop):
+            return None
+
+        def digest(text):
+            return hashlib.new(hashname, text.encode('utf-8')).hexdigest()
+
+        nc = '%08x' % challenge['nc']
+        cnonce = os.urandom(8).hex()
+        ha1 = digest('%s:%s:%s' % (self.username, challenge['realm'],
+                                   self.password))
+        if algorithm.endswith('-SESS'):
+            ha1 = digest('%s:%s:%s' % (ha1, challenge['nonce'], cnonce))
+        ha2 = digest('%s:%s' % (method, uri))
+        if challenge['qop']:
+            response = digest('%s:%s:%s:%s:auth:%s' % (
+                ha1, challenge['nonce'], nc, cnonce, ha2))
+        else:
+            response = digest('%s:%s:%s' % (ha1, challenge['nonce'], ha2))
+        fields = ['username="%s"' % self.username,
+                  'realm="%s"' % challenge['realm'],
+                  'nonce="%s"' % challenge['nonce'],
+                  'uri="%s"' % uri, 'response="%s"' % response]
+        if challenge['opaque']:
+            fields.append('opaque="%s"' % challenge['opaque'])
+        if challenge['algorithm']:
+            fields.append('algorithm="%s"' % challenge['algorithm'])
+        if challenge['qop']:
+            fields.append('qop="auth", nc=%s, cnonce="%s"' % (nc, cnonce))
+        return 'Digest ' + ', '.join(fields)
+
+    def handle_401(self, r, **kwargs):
+        # answers the challenge of a camera once: sends the request again
+        # with Digest, or with Basic when a camera remembered for Digest
+        # asks for Basic again, unless the credentials it got were already
+        # an answer to this challenge (wrong username or password)
+        if r.status_code != 401:
+            return r
+        import re
+        from requests.utils import parse_dict_header
+        challenge = r.headers.get('www-authenticate', '')
+        sent = r.request.headers.get('Authorization', '')
+        digest = re.search(r'digest\s+(.*)', challenge, re.I | re.S)
+        if digest:
+            params = parse_dict_header(digest.group(1))
+            nonce = params.get('nonce', '')
+            if sent and 'nonce="%s"' % nonce in sent:
+                return r
+            known = {'scheme': 'digest', 'realm': params.get('realm', ''),
+                     'nonce': nonce, 'opaque': params.get('opaque'),
+                     'qop': params.get('qop'),
+                     'algorithm': params.get('algorithm'), 'nc': 0}
+        elif re.match(r'\s*basic\b', challenge, re.I) and \
+                not sent.lower().startswith('basic'):
+            known = {'scheme': 'basic'}
+        else:
+            return r
+        host = url_host(r.url)
+        with self.lock:
+            current = self.hosts.get(host)
+            # another request may have answered the same challenge already
+            if current is None or current['scheme'] != known['scheme'] or \
+                    current.get('nonce') != known.get('nonce'):
+                self.hosts[host] = known
+        header = self.authorization(host, r.request.method,
+                                    r.request.path_url)
+        if header is None:
+            return r
+
+        # release the connection of the challenge before asking again
+        r.content
+        r.close()
+        prep = r.request.copy()
+        prep.headers['Authorization'] = header
+        retry = r.connection.send(prep, **kwargs)
+        retry.history.append(r)
+        retry.request = prep
+        # the hooks of the session (throttle, progress) run after this one
+        # and get the answer instead of the challenge
+        return retry
+
+
+def url_host(url):
+    # host:port of url, the key of a camera in CameraAuth
+    from urllib.parse import urlsplit
+    return urlsplit(url).netloc.lower()
+
+
+def camera_auth(username, password):
+    # the CameraAuth of an account so negotiated camera's stay known to all
+    # sessions of the program
+    if (username, password) not in auths:
+        auths[(username, password)] = CameraAuth(username, password)
+    return auths[(username, password)]
+
+
+class ResolvingAdapter:
+    # Transport adapter of a session connecting to a devicename at the
+    # address resolve_devices found for it (see resolved_address) instead of
+    # looking it up again for every new connection. The request keeps the
+    # devicename in its Host header and the response its original url, other
+    # hosts are passed on to adapter unchanged.
+    def __init__(self, adapter):
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        from urllib.parse import urlsplit
+        parts = urlsplit(request.url)
+        address = resolved_address(parts.hostname or '')
+        if address is None:
+            return self.adapter.send(request, **kwargs)
+        netloc = '[%s]' % address if ':' in address else address
+        if parts.port:
+            netloc += ':%d' % parts.port
+        direct = request.copy()
+        direct.url = parts._replace(netloc=netloc).geturl()
+        direct.headers['Host'] = parts.netloc.rpartition('@')[2]
+        response = self.adapter.send(direct, **kwargs)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+def new_session(username, password, pool=None):
+    # a session keeps the connection to a camera alive between requests
+    # pool sets the number of camera's (and connections per camera) kept
+    # open when one session is shared by many workers
+    # requests is only imported here so tools working on local files only
+    # start fast
+    import requests
+    # Ignore the warning that SSL CA will not be checked
+    requests.packages.urllib3.disable_warnings(requests.packages.urllib3.
+                                               exceptions.InsecureRequestWarning)
+    session = requests.Session()
+    session.auth = camera_auth(username, password)
+    session.verify = False
+    if pool:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool,
+                                                pool_maxsize=pool)
+    else:
+        adapter = requests.adapters.HTTPAdapter()
+    adapter = ResolvingAdapter(adapter)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    for hook in response_hooks:
+        session.hooks['response'].append(hook)
+    return session
+
+
+class FilePayload:
+    # Request body made of a preamble, the contents of a file and a
+    # postamble. The file is streamed in chunks straight into the request
+    # instead of being copied into memory or a temporary file first. The
+    # length is known in advance so requests sends a Content-Length header
+    # (not a chunked body) and the file is opened again when the body has
+    # to be sent a second time, like after an authentication challenge.
+    def __init__(self, preamble, filename, postamble, chunksize=CHUNKSIZE):
+        self.preamble = preamble.encode('utf-8')
+        self.filename = filename
+        self.postamble = postamble.encode('utf-8')
+        self.chunksize = chunksize
+
+    def __len__(self):
+        return len(self.preamble) + os.path.getsize(self.filename) + \
+            len(self.postamble)
+
+    def __iter__(self):
+        yield self.preamble
+        with open(self.filename, 'rb') as f:
+            chunk = f.read(self.chunksize)
+            while chunk:
+                yield chunk
+                chunk = f.read(self.chunksize)
+        yield self.postamble
+
+
+def transfer(session, ipaddr, use_ssl, payload, timeout):
+    # sends a remoteconfig commandfile (payload) to a camera
+    # the payload is a string, bytes or a FilePayload
+    # returns (True, response) or (False, reason of failure)
+    import requests
+    from http import HTTPStatus
+    url = base_url(ipaddr, use_ssl) + '/admin/remoteconfig'
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    try:
+        headers = {'content-type': 'application/x-www-form-urlencoded'}
+        response = session.post(url, data=payload, headers=headers,
+                                timeout=timeout)
+    except requests.ConnectionError:
+        return False, 'Unable to connect.'
+    except requests.Timeout:
+        return False, 'Timeout.'
+    except requests.exceptions.RequestException as e:
+        return False, 'Uncaught error: ' + str(e)
+    content = response.text
+    if not response:
+        return False, 'HTTP response code: ' + \
+            HTTPStatus(response.status_code).phrase
+    if content.find('#read::') != 0:
+        return False, 'Are you sure this is Mobotix?'
+    return True, content
+
+
+def device_timestamp(session, ipaddr, use_ssl=False, timeout=10):
+    # VERSION and DATE of the timestamp section of the camera
+    # returns (True, {'VERSION': ..., 'DATE': ...}) or
+    # (False, reason of failure)
+    (result, received) = transfer(session, ipaddr, use_ssl, TIMESTAMP_CMD,
+                                  timeout)
+    if not result:
+        return False, received
+    return True, mxcfg.parse_timestamp(received)
+
+
+def read_cache(cachefile):
+    # JSON cache or state file holding a dict, like {IP: {'time': ...}}
+    try:
+        with open(cachefile, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_cache(cachefile, cache):
+    # written next to the cache first so a stopped run never leaves half
+    # a cache behind
+    try:
+        with open(cachefile + '.tmp', 'w') as f:
+            json.dump(cache, f)
+        os.replace(cachefile + '.tmp', cachefile)
+    except IOError:
+        print("Warning: Unable to write cache file", cachefile)
+
+
+def cached_timestamp(cache, ipaddr, ttl=TIMESTAMP_TTL):
+    # the cached timestamp of a camera when it is younger than ttl seconds
+    entry = cache.get(ipaddr)
+    if entry is None or time.time() - entry['time'] > ttl:
+        return None
+    return entry
+
+
+def lookup_timestamp(session, ipaddr, use_ssl=False, timeout=10, cache=None,
+                     ttl=TIMESTAMP_TTL):
+    # timestamp of a camera from the cache or, when it holds no fresh
+    # answer, from the camera itself (and then cached)
+    # returns (True, {'VERSION': ..., 'DATE': ..., 'time': ...}, cached) or
+    # (False, reason of failure, False)
+    if cache is None:
+        cache = {}
+    entry = cached_timestamp(cache, ipaddr, ttl)
+    if entry is not None:
+        return True, entry, True
+    (result, timestamp) = device_timestamp(session, ipaddr, use_ssl, timeout)
+    if not result:
+        return False, timestamp, False
+    entry = dict(timestamp, time=time.time())
+    cache[ipaddr] = entry
+    return True, entry, False
+
+
+def run_pool(func, items, workers=WORKERS, policy=None):
+    # Calls func(item) for all items using a pool of worker threads and
+    # yields (item, result) as soon as a result is available.
+    # No more than twice the number of workers are queued at any time so
+    # memory stays flat even for very long devicelists.
+    # With a GroupPolicy no more than policy.limit devices of the same group
+    # are queued at once. Devices of a full group are held back (up to four
+    # times the number of workers) while devices of other groups go first,
+    # so the pool stays busy without flooding one part of the network.
+    import concurrent.futures
+    workers = max(1, workers)
+    items = iter(items)
+    pending = {}
+    held = []
+    running = {}
+
+    def room(group):
+        return policy is None or policy.limit is None or \
+            running.get(group, 0) < policy.limit
+
+    def next_item():
+        # the first held item of a group with room, else the next new one
+        for i, (item, group) in enumerate(held):
+            if room(group):
+                del held[i]
+                return item, group
+        while len(held) < 4 * workers:
+            item = next(items, held)
+            if item is held:
+                break
+            group = policy.group(item) if policy else None
+            if room(group):
+                return item, group
+            held.append((item, group))
+        return None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < 2 * workers:
+                found = next_item()
+                if found is None:
+                    break
+                (item, group) = found
+                running[group] = running.get(group, 0) + 1
+                pending[pool.submit(func, item)] = found
+            if not pending:
+                break
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                (item, group) = pending.pop(future)
+                running[group] -= 1
+                yield item, future.result()
+
+
+class Scheduler:
+    # Runs work on devices at a given time on a shared pool of workers, for
+    # the tools that keep coming back to their devices (mxdaemon, mxmic
+    # --watch, the ready polls of mxrestore). The items waiting for their
+    # time are kept in a heap. No more than twice the number of workers are
+    # queued in the pool; with a GroupPolicy devices of a full group wait
+    # until a device of that group is done while other groups go first.
+    # Subclasses implement work(item), called in a worker, and
+    # done(item, result), called from step() in the thread running the
+    # scheduler. When work raises, done gets the result of
+    # failure(item, error) instead. schedule() may be called from any
+    # thread.
+    def __init__(self, workers=WORKERS, policy=None):
+        import concurrent.futures
+        import queue
+        self.workers = max(1, workers)
+        self.policy = policy
+        self.waiting = []  # heap of (due time, sequence, item)
+        self.sequence = itertools.count()  # keeps equally due items in order
+        self.lock = threading.Lock()  # guards waiting
+        self.finished = queue.Queue()
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers)
+        self.in_pool = 0
+        self.group_running = {}  # items per group in the pool
+
+    def schedule(self, due, item):
+        with self.lock:
+            heapq.heappush(self.waiting, (due, next(self.sequence), item))
+
+    def group(self, item):
+        # the group of an item for the GroupPolicy
+        return None
+
+    def work(self, item):
+        raise NotImplementedError
+
+    def done(self, item, result):
+        raise NotImplementedError
+
+    def failure(self, item, error):
+        # result of an item whose work raised error
+        raise error
+
+    def room(self, group):
+        return self.policy is None or self.policy.limit is None or \
+            self.group_running.get(group, 0) < self.policy.limit
+
+    def submit(self, item, group):
+        future = self.pool.submit(self.work, item)
+        future.add_done_callback(
+            lambda f: self.finished.put((item, group, f)))
+        self.in_pool += 1
+        self.group_running[group] = self.group_running.get(group, 0) + 1
+
+    def finish(self, item, group, future):
+        self.in_pool -= 1
+        self.group_running[group] -= 1
+        try:
+            result = future.result()
+        except Exception as e:
+            result = self.failure(item, e)
+        self.done(item, result)
+
+    def step(self, wake=None):
+        # starts the items that are due and handles the results that came
+        # in. Returns after at most a second, or at wake (a time) if earlier.
+        import queue
+        now = time.time()
+        limit = 2 * self.workers
+        deferred = []
+        with self.lock:
+            while self.waiting and self.waiting[0][0] <= now and \
+                    self.in_pool < limit:
+                entry = heapq.heappop(self.waiting)
+                group = self.group(entry[2])
+                if self.room(group):
+                    self.submit(entry[2], group)
+                else:
+                    deferred.append(entry)
+            for entry in deferred:
+                heapq.heappush(self.waiting, entry)
+            wake = now + 1 if wake is None else min(wake, now + 1)
+            if self.waiting and self.in_pool < limit and not deferred:
+                wake = min(wake, self.waiting[0][0])
+        try:
+            self.finish(*self.finished.get(
+                timeout=max(0.05, wake - time.time())))
+            while True:
+                self.finish(*self.finished.get_nowait())
+        except queue.Empty:
+            pass
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def response_size(response, stream=False):
+    # bytes sent and received by a request, for streamed responses as far as
+    # the camera announced them
+    size = len(response.request.body or b'')
+    if stream:
+        return size + int(response.headers.get('content-length') or 0)
+    return size + len(response.content)
+
+
+class GroupPolicy:
+    # Limits the number of camera's handled at the same time and the
+    # bandwidth used per group of camera's, like all camera's behind one
+    # edge switch. A group is the subnet of the camera (group_by 'subnet'
+    # is a /24, 'subnet/22' sets the prefix) or the value of a devicelist
+    # column (group_by is the column name). Rows of a devicelist without
+    # that column are grouped by subnet.
+    # limit is the number of camera's per group handled at the same time,
+    # rate the number of bytes per second per group (None is unlimited).
+    # The bandwidth is enforced by a response hook on new sessions (see
+    # new_session): the body of every response is read chunk by chunk and
+    # the reading worker is held back as soon as its group is over rate,
+    # so a running transfer is slowed down as well. Call close() when done
+    # to remove the hook.
+    def __init__(self, group_by='subnet', limit=None, rate=None, header=None):
+        self.column = None
+        self.prefix = 24
+        if group_by.startswith('subnet'):
+            if group_by != 'subnet':
+                self.prefix = int(group_by[len('subnet/'):])
+                if not 0 <= self.prefix <= 32:
+                    raise ValueError('subnet prefix must be 0..32')
+        else:
+            self.column = group_by
+        if limit is not None and limit < 1:
+            raise ValueError('group limit must be at least 1')
+        self.limit = limit
+        self.rate = rate
+        self.header = header
+        self.hosts = {}  # group of every host seen by group()
+        self.free = {}  # time at which the bandwidth of a group is free
+        self.lock = threading.Lock()
+
+    def subnet(self, ipaddr):
+        # camera's given by name are a group of their own
+        import ipaddress
+        try:
+            return str(ipaddress.ip_network(ipaddr + '/' + str(self.prefix),
+                                            strict=False))
+        except ValueError:
+            return ipaddr
+
+    def group(self, row, header=None):
+        header = header or self.header
+        host = device_host(row[0]).lower()
+        group = None
+        if self.column and header and self.column in header:
+            column = header.index(self.column)
+            if column < len(row) and row[column]:
+                group = row[column]
+        if group is None:
+            group = self.subnet(host)
+        self.hosts[host] = group
+        return group
+
+    def charge(self, group, size):
+        # counts size bytes sent or received by the group and sleeps until
+        # the group is back within its rate
+        now = time.time()
+        with self.lock:
+            free = max(self.free.get(group, 0), now) + size / self.rate
+            self.free[group] = free
+        if free > now:
+            time.sleep(free - now)
+
+    def throttle(self, response, *args, **kwargs):
+        # response hook: charges the request body and lets the body of the
+        # response be read at the rate of the group of the camera
+        if not self.rate:
+            return
+        from urllib.parse import urlsplit
+        host = (urlsplit(response.url).hostname or '').lower()
+        group = self.hosts.get(host) or self.subnet(host)
+        try:
+            self.charge(group, len(response.request.body or b''))
+        except TypeError:
+            pass  # a body of unknown length
+        response.raw = ThrottledRaw(response.raw, self, group)
+
+    def close(self):
+        if self.throttle in response_hooks:
+            response_hooks.remove(self.throttle)
+
+
+class ThrottledRaw:
+    # The raw (urllib3) response of a camera of which the body is read at
+    # the rate of its group. Everything else is left to the response.
+    def __init__(self, raw, policy, group):
+        self.raw = raw
+        self.policy = policy
+        self.group = group
+
+    def stream(self, amt=CHUNKSIZE, decode_content=None):
+        for chunk in self.raw.stream(amt, decode_content=decode_content):
+            self.policy.charge(self.group, len(chunk))
+            yield chunk
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def add_policy_arguments(parser):
+    parser.add_argument("--groupby", nargs=1, help="\
+                        group camera's by devicelist column or by subnet \
+                        like subnet/24 (default = subnet)")
+    parser.add_argument("--grouplimit", nargs=1, help="\
+                        specify number of camera's per group handled at the \
+                        same time")
+    parser.add_argument("--grouprate", nargs=1, help="\
+                        specify maximum kB/s per group")
+
+
+def policy_from_args(args, header=None):
+    # GroupPolicy from the --group* options or None when not used
+    # the policy is also used for the bandwidth of new sessions until it is
+    # closed
+    if not (args.grouplimit or args.grouprate):
+        return None
+    group_by = args.groupby[0] if args.groupby else 'subnet'
+    try:
+        limit = int(args.grouplimit[0]) if args.grouplimit else None
+        rate = 1000 * float(args.grouprate[0]) if args.grouprate else None
+        policy = GroupPolicy(group_by, limit, rate, header)
+    except ValueError:
+        print("Unable to understand group options " + group_by)
+        print("Try subnet/<prefix> or a column name and numbers for the " +
+              "limit and rate")
+        sys.exit()
+    if policy.column and header and policy.column not in header:
+        print("Warning: Column %s not found in devicelist, grouping by subnet"
+              % (policy.column))
+    if policy.rate:
+        # first, so hooks reading the body (Progress) read it throttled
+        response_hooks.insert(0, policy.throttle)
+    return policy
+
+
+class Progress:
+    # Shows the number of devices done, failed and in flight, the requests
+    # and bytes per second and the expected time left of a run. On a
+    # terminal the status is a single line kept below the other output,
+    # otherwise a status line is printed every interval seconds.
+    # Wrap the function handling a device with track() (in flight and
+    # duration), call finished() for every result and use print() for
+    # other output. Requests and bytes are counted by a response hook on
+    # new sessions. When not enabled only print() does something.
+    def __init__(self, total, workers=1, enabled=True, interval=None):
+        self.total = total
+        self.workers = max(1, workers)
+        self.enabled = enabled
+        self.tty = enabled and sys.stdout.isatty()
+        if interval is None:
+            interval = 0.5 if self.tty else 10
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.inflight = 0
+        self.requests = 0
+        self.bytes = 0
+        self.busy = 0.0  # seconds spent on the finished devices
+        self.start = time.time()
+        self.next_report = self.start + interval
+        self.shown = False
+        self.lock = threading.Lock()
+        if enabled:
+            response_hooks.append(self.count)
+
+    def track(self, func):
+        def tracked(item):
+            with self.lock:
+                self.inflight += 1
+            start = time.time()
+            try:
+                return func(item)
+            finally:
+                with self.lock:
+                    self.inflight -= 1
+                    self.busy += time.time() - start
+        return tracked
+
+    def count(self, response, *args, **kwargs):
+        size = response_size(response, kwargs.get('stream'))
+        with self.lock:
+            self.requests += 1
+            self.bytes += size
+
+    def finished(self, failed=False):
+        if failed:
+            self.failed += 1
+        else:
+            self.done += 1
+        if self.enabled and time.time() >= self.next_report:
+            self.report()
+
+    def status(self):
+        elapsed = max(time.time() - self.start, 0.001)
+        finished = self.done + self.failed
+        left = self.total - finished
+        if finished:
+            # the time a device takes so far, with as many at once as
+            # there are workers (or devices left)
+            eta = left * self.busy / finished / max(1, min(self.workers, left))
+            eta = '%d:%02d:%02d' % (eta // 3600, eta // 60 % 60, eta % 60)
+        else:
+            eta = '?'
+        return ('[%d/%d] done %d, failed %d, in flight %d | %.1f req/s, '
+                '%.1f kB/s | ETA %s'
+                % (finished, self.total, self.done, self.failed,
+                   self.inflight, self.requests / elapsed,
+                   self.bytes / elapsed / 1000, eta))
+
+    def report(self):
+        self.next_report = time.time() + self.interval
+        if self.tty:
+            sys.stdout.write('\r' + self.status() + '\x1b[K')
+            sys.stdout.flush()
+            self.shown = True
+        else:
+            print(self.status())
+
+    def print(self, *args):
+        if self.shown:
+            sys.stdout.write('\r\x1b[K')
+            self.shown = False
+        print(*args)
+        if self.tty:
+            self.report()
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.report()
+        if self.tty:
+            sys.stdout.write('\n')
+            self.shown = False
+        if self.count in response_hooks:
+            response_hooks.remove(self.count)
+
+
+def add_progress_argument(parser):
+    parser.add_argument("--progress", help="\
+                        show devices done, failed and in flight, requests \
+                        and bytes per second and the expected time left",
+                        action="store_true")
+
+
+class ResultWriter:
+    # Writes result records (dicts) one by one to a JSONL or CSV file,
+    # depending on the extension of the filename. Every record is flushed
+    # straight to disk so nothing piles up in memory during long runs.
+    def __init__(self, filename, fieldnames):
+        self.fieldnames = fieldnames
+        self.jsonl = filename.lower().endswith(('.jsonl', '.json'))
+        self.file = open(filename, 'w', newline='')
+        if not self.jsonl:
+            self.writer = csv.DictWriter(self.file, fieldnames=fieldnames,
+                                         dialect='semicolons',
+                                         extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.jsonl:
+            self.file.write(json.dumps(record) + '\n')
+        else:
+            self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -9,224 +9,330 @@
 # use option -h or --help for instructions
 # See https://github.com/keptenkurk/mxpgm/blob/master/README.md for
 # instructions
+# Programming can also be done from other python code:
+#   import mxpgm
+#   commands = mxpgm.render_commands('setname.conf', header, row)
+#   record = mxpgm.program_device(row[0], commands, 'admin', 'meinsm')
+# With -i (idempotent) the sections written by "write params" are viewed
+# first and only the lines that change the camera's config are sent.
+# Camera's already holding all values are not programmed at all.
 #
 # release info
 # 1.0 first release 10/12/16 Paul Merkx
 # 1.1 separate tools for backup and restor 29/8/17 Paul Merkx
 # 1.2 added SSL support, verbose switch, timeout and moved to Python3
 # 1.3 changed to the use of requests instead of pycurl
+# 1.4 programming available as importable function, idempotent mode
 # ****************************************************************************
 import os
-import requests
-from http import HTTPStatus
 import sys
 import argparse
-import csv
-import io
+import mxcfg
+import mxnet
 
-RELEASE = '1.3 - 1-6-2020'
+RELEASE = '1.4 - 19-10-2026'
 TIMEOUT = 10  # requests timeout (overwriteable by -t option)
-# Ignore the warning that SSL CA will not be checked
-requests.packages.urllib3.disable_warnings(requests.packages.urllib3.
-                                           exceptions.InsecureRequestWarning)
-
-
-def validate_ip(s):
-    a = s.split('.')
-    if len(a) != 4:
-        return False
-    for x in a:
-        if not x.isdigit():
-            return False
-        i = int(x)
-        if i < 0 or i > 255:
-            return False
-    return True
+PARAMS_CMD = 'write params'
+# commands allowed around write params blocks in the idempotent mode
+PLAIN_CMDS = ('helo', 'store', 'update', 'reboot', 'quit')
 
 
-def replace_all(text, dic):
-    for i, j in dic.items():
-        text = text.replace(i, j)
-    return text
+def render_commands(commandfile, header, row):
+    # commandfile with the {LABEL} parameters of a devicelist row replaced
+    replacedict = mxnet.labels(header, row)
+    with open(commandfile, 'r') as infile:
+        commands = mxnet.replace_all(infile.read(), replacedict)
+    # commandfile needs to start and end with an empty line
+    return '\n' + commands + '\n'
 
 
-def transfer(ipaddr, use_ssl, username, password, commandfile):
-    # transfers commandfile to camera
-    if use_ssl:
-        url = 'https://' + ipaddr + '/admin/remoteconfig'
-    else:
-        url = 'http://' + ipaddr + '/admin/remoteconfig'
-    try:
-        with open(commandfile, 'rb') as payload:
-            headers = {'content-type': 'application/x-www-form-urlencoded'}
-            response = requests.post(url, auth=(username, password),
-                                     data=payload, verify=False,
-                                     headers=headers, timeout=TIMEOUT)
-    except requests.ConnectionError:
-        print('Unable to connect. ', end='')
-        return False, ''
-    except requests.Timeout:
-        print('Timeout. ', end='')
-        return False, ''
-    except requests.exceptions.RequestException as e:
-        print('Uncaught error:', str(e), end='')
-        return False, ''
-    else:
-        content = response.text
-        if response:
-            if (content.find('#read::') != 0):
-                print('Are you sure this is Mobotix? ', end='')
-                return False, ''
+def parse_commands(commands):
+    # list of (command, param) of the lines of a (rendered) commandfile.
+    # param is (section, profile, key, value) for the lines of a write
+    # params block like ethernet/HOSTNAME=cam1 or
+    # events/ima_5a805a6b/ima=ima_5a805a6b:..., None for other commands.
+    # returns None when the commands can not be compared to the camera's
+    # config (write, append, delete, ...)
+    parsed = []
+    in_params = False
+    for line in commands.splitlines():
+        command = line.strip()
+        if not command or command.startswith('#'):
+            continue
+        if command == PARAMS_CMD:
+            in_params = True
+        elif command in PLAIN_CMDS:
+            in_params = False
+        elif in_params and '=' in command:
+            (path, sep, value) = command.partition('=')
+            path = path.strip().split('/')
+            if len(path) == 2:
+                parsed.append((command, (path[0], None, path[1], value)))
+            elif len(path) == 3:
+                parsed.append((command, (path[0], path[1], path[2], value)))
             else:
-                return True, content
+                return None
+            continue
         else:
-            print('HTTP response code: ',
-                  HTTPStatus(response.status_code).phrase)
-            return False, ''
-
-# ***************************************************************
-# *** Main program ***
-# ***************************************************************
-print('MxProgram ' + RELEASE + ' by (c) Simac Healthcare.')
-print('Disclaimer: ')
-print('USE THIS SOFTWARE AT YOUR OWN RISK')
-print(' ')
-
-# *** Read arguments passed on commandline
-parser = argparse.ArgumentParser()
-parser.add_argument("-v", "--verify", help="\
-                    don't program camera yet but show resulting \
-                    commandfile(s)", action="store_true")
-parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target \
-                     device IP when programming a single camera")
-parser.add_argument("-l", "--devicelist", nargs=1, help="\
-                    specify target device list in CSV \
-                    when programming multiple camera's")
-parser.add_argument("-c", "--commandfile", nargs=1, help="\
-                    specify commandfile to send to camera(s). \
-                    See http://developer.mobotix.com/paks/\
-                    help_cgi-remoteconfig.html")
-parser.add_argument("-u", "--username", nargs=1, help="\
-                    specify target device admin username")
-parser.add_argument("-p", "--password", nargs=1, help="\
-                    specify target device admin password")
-parser.add_argument("-s", "--ssl", help="\
-                    use SSL to communicate (HTTPS)", action="store_true")
-parser.add_argument("-o", "--output", help="\
-                    output device response to console", action="store_true")
-parser.add_argument("-t", "--timeout", nargs=1, help="\
-                    specify cUrl timeout in seconds (default = 10)")
-
-args = parser.parse_args()
-
-# *** Check validity of the arguments
-if (args.deviceIP is None and args.devicelist is None) or \
-   (args.deviceIP and args.devicelist):
-    print("Either deviceIP or devicelist is required")
-    sys.exit()
-
-if args.username is None:
-    print("Default Admin account assumed")
-    username = 'admin'
-else:
-    username = args.username[0]
-
-if args.password is None:
-    print("Default Admin password assumed")
-    password = 'meinsm'
-else:
-    password = args.password[0]
-
-if args.timeout:
-    try:
-        TIMEOUT = int(args.timeout[0])
-    except:
-        print("Unable to understand timeout value of " + args.timeout[0])
-        print("Try an interger")
-        sys.exit()
+            return None
+        parsed.append((command, None))
+    return parsed
+
+
+def param_changes(param, cfg):
+    # True when writing param would change the viewed config cfg
+    (section, profile, key, value) = param
+    if section not in cfg:
+        return True
+    for (name, current) in mxcfg.section_params(cfg.section(section)):
+        if name != key:
+            continue
+        if profile is None or current.split(':', 1)[0] == profile:
+            return current != value
+    return True
+
+
+def changed_commands(session, ipaddr, use_ssl, commands, timeout=TIMEOUT):
+    # views the sections the commands write in a single request and leaves
+    # out the write params lines holding values the camera already has
+    # returns (True, (commands, nr of changed lines, nr of lines)) with
+    # commands None when nothing changes, or (False, reason of failure)
+    parsed = parse_commands(commands)
+    if parsed is None:
+        return False, 'Commandfile can not be compared to the camera config'
+    sections = []
+    for (command, param) in parsed:
+        if param and param[0] not in sections:
+            sections.append(param[0])
+    if not sections:
+        return True, (commands, 0, 0)
+    view = '\nhelo\n' + ''.join('view section %s\n' % (section)
+                                 for section in sections) + 'quit\n\n'
+    (result, received) = mxnet.transfer(session, ipaddr, use_ssl, view,
+                                        timeout)
+    if not result:
+        return False, received
+    cfg = mxcfg.CfgFile(ipaddr, data=received.encode(mxcfg.ENCODING))
+    out = []
+    block = None
+    changed = 0
+    params = 0
+    for (command, param) in parsed:
+        if command == PARAMS_CMD:
+            block = [command]
+            out.append(block)
+        elif param is None:
+            block = None
+            out.append([command])
+        else:
+            params += 1
+            if param_changes(param, cfg):
+                changed += 1
+                block.append(command)
+    if not changed:
+        return True, (None, 0, params)
+    lines = [line for block in out if len(block) > 1 or
+             block[0] != PARAMS_CMD for line in block]
+    return True, ('\n' + '\n'.join(lines) + '\n\n', changed, params)
+
+
+def program_device(ipaddr, commands, username, password, use_ssl=False,
+                   timeout=TIMEOUT, session=None, idempotent=False):
+    # sends the (rendered) commands to a camera
+    # idempotent only sends the write params lines that change the config
+    # returns a record with the IP, the response of the camera, whether the
+    # commands were sent, the number of changed and compared params
+    # (idempotent) and an error ('' when programming succeeded)
+    if session is None:
+        with mxnet.new_session(username, password) as session:
+            return program_device(ipaddr, commands, username, password,
+                                  use_ssl, timeout, session, idempotent)
+    record = {'IP': ipaddr, 'response': '', 'sent': False, 'changed': '',
+              'params': '', 'error': ''}
+    if idempotent:
+        (result, changes) = changed_commands(session, ipaddr, use_ssl,
+                                             commands, timeout)
+        if not result:
+            record['error'] = changes
+            return record
+        (commands, record['changed'], record['params']) = changes
+        if commands is None:
+            return record
+    (result, received) = mxnet.transfer(session, ipaddr, use_ssl, commands,
+                                        timeout)
+    record['sent'] = True
+    if result:
+        record['response'] = received
+    else:
+        record['error'] = received
+    return record
+
+
+def main(argv=None):
+    print('MxProgram ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--verify", help="\
+                        don't program camera yet but show resulting \
+                        commandfile(s)", action="store_true")
+    parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target \
+                         device IP when programming a single camera")
+    parser.add_argument("-l", "--devicelist", nargs=1, help="\
+                        specify target device list in CSV \
+                        when programming multiple camera's")
+    parser.add_argument("-c", "--commandfile", nargs=1, help="\
+                        specify commandfile to send to camera(s). \
+                        See http://developer.mobotix.com/paks/\
+                        help_cgi-remoteconfig.html")
+    parser.add_argument("-u", "--username", nargs=1, help="\
+                        specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1, help="\
+                        specify target device admin password")
+    parser.add_argument("-s", "--ssl", help="\
+                        use SSL to communicate (HTTPS)", action="store_true")
+    parser.add_argument("-o", "--output", help="\
+                        output device response to console", action="store_true")
+    parser.add_argument("-t", "--timeout", nargs=1, help="\
+                        specify cUrl timeout in seconds (default = 10)")
+    parser.add_argument("-i", "--idempotent", help="\
+                        only send the write params lines that change the \
+                        camera's config", action="store_true")
+    mxnet.add_shard_argument(parser)
+    mxnet.add_progress_argument(parser)
+
+    args = parser.parse_args(argv)
 
-if args.deviceIP:
-    if not validate_ip(args.deviceIP[0]):
-        print("Warning: The device %s is not a valid IPv4 address!"
-              % (args.deviceIP[0]))
-        print("Assuming %s is the devicename instead."
-              % (args.deviceIP[0]))
-
-if args.devicelist:
-    if not os.path.exists(args.devicelist[0]):
-        print("The devicelist '%s' does not exist in the current directory!"
-              % (args.devicelist[0]))
+    # *** Check validity of the arguments
+    if (args.deviceIP is None and args.devicelist is None) or \
+       (args.deviceIP and args.devicelist):
+        print("Either deviceIP or devicelist is required")
         sys.exit()
 
-if args.commandfile:
-    if not os.path.exists(args.commandfile[0]):
-        print("The commandfile '%s' does not exist in the current directory!"
-              % (args.commandfile[0]))
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
+    else:
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    timeout = TIMEOUT
+    if args.timeout:
+        try:
+            timeout = int(args.timeout[0])
+        except:
+            print("Unable to understand timeout value of " + args.timeout[0])
+            print("Try an interger")
+            sys.exit()
+
+    if args.deviceIP:
+        if not mxnet.validate_ip(args.deviceIP[0]):
+            print("Warning: The device %s is not a valid IPv4 address!"
+                  % (args.deviceIP[0]))
+            print("Assuming %s is the devicename instead."
+                  % (args.deviceIP[0]))
+
+    if args.devicelist:
+        if not os.path.exists(args.devicelist[0]):
+            print("The devicelist '%s' does not exist in the current directory!"
+                  % (args.devicelist[0]))
+            sys.exit()
+
+    if args.commandfile:
+        if not os.path.exists(args.commandfile[0]):
+            print("The commandfile '%s' does not exist in the current directory!"
+                  % (args.commandfile[0]))
+            sys.exit()
+    else:
+        print("The program requires a commandfile parameter! (-c [file])")
         sys.exit()
-else:
-    print("The program requires a commandfile parameter! (-c [file])")
-    sys.exit()
-
-if args.ssl:
-    use_ssl = True
-else:
-    use_ssl = False
-
-if args.output:
-    echo_output = True
-else:
-    echo_output = False
-
-print('Starting')
-print('Build devicelist...')
-
-# Build devicelist from devicelist file or from single parameter
-# devicelist is a list of lists
-devicelist = []
-if args.devicelist:
-    csv.register_dialect('semicolons', delimiter=';')
-    with open(args.devicelist[0], 'r') as f:
-        reader = csv.reader(f, dialect='semicolons')
-        for row in reader:
-            devicelist.append(row)
-else:
-    devicelist.append(['IP'])
-    devicelist.append([args.deviceIP[0]])
-# devicelist[0] now contains a list of labels we need to replace
-# in the commandfile.
-
-for devicenr in range(1, len(devicelist)):
-    # skip device if starts with comment
-    if devicelist[devicenr][0][0] != '#':
-        # build replacement dictionary
-        replacedict = {}
-        for param in range(1, len(devicelist[devicenr])):
-            replacedict['{' + devicelist[0][param] + '}'] =\
-              devicelist[devicenr][param]
-        ipaddr = devicelist[devicenr][0]
-        print('About to program device ' + ipaddr)
-        infile = open(args.commandfile[0], 'r')
-        outfile = open('commands.tmp', 'w')
-        outfile.write('\n')  # commandfile needts to start with empty line
-        for line in infile:
-            outfile.write(replace_all(line, replacedict))
-        outfile.write('\n')  # commandfile needs to end with empty line
-        infile.close()
-        outfile.close()
+
+    if args.idempotent:
+        with open(args.commandfile[0], 'r') as infile:
+            if parse_commands(infile.read()) is None:
+                print("The idempotent mode (-i) only supports commandfiles "
+                      "with write params, helo, store, update, reboot and "
+                      "quit commands")
+                sys.exit()
+
+    use_ssl = bool(args.ssl)
+    shard = mxnet.shard_from_args(args)
+    echo_output = bool(args.output)
+
+    print('Starting')
+    print('Build devicelist...')
+
+    devicelist = mxnet.read_devicelist(args.devicelist and args.devicelist[0],
+                                       args.deviceIP and args.deviceIP[0])
+    # devicelist[0] now contains a list of labels we need to replace
+    # in the commandfile.
+
+    rows = list(mxnet.devices(devicelist, shard))
+    unresolved = []
+    if not args.verify:
+        (rows, unresolved) = mxnet.resolve_devices(rows)
+    progress = mxnet.Progress(len(rows) + len(unresolved), 1,
+                              args.progress and not args.verify)
+
+    def program(job):
+        (row, commands) = job
+        return program_device(row[0], commands, username, password, use_ssl,
+                              timeout, idempotent=args.idempotent)
+
+    program = progress.track(program)
+    nr_changed = 0
+    nr_params = 0
+    nr_unchanged = 0
+    for (row, error) in unresolved:
+        progress.finished(True)
+        progress.print(error + ' ERROR: Programming ' + row[0] + ' failed.')
+        progress.print('')
+    for row in rows:
+        ipaddr = row[0]
+        progress.print('About to program device ' + ipaddr)
+        commands = render_commands(args.commandfile[0], devicelist[0], row)
         if args.verify:
             print('------------verify output------------')
-            with open('commands.tmp', 'r') as outfile:
-                print(outfile.read())
+            print(commands)
             print('-------------------------------------')
         else:
-            (result, received) = \
-              transfer(ipaddr, use_ssl, username, password, 'commands.tmp')
-            if result:
+            record = program((row, commands))
+            progress.finished(bool(record['error']))
+            if not record['error'] and args.idempotent and \
+                    not record['sent']:
+                nr_unchanged += 1
+                progress.print('Device %s already up to date (%d params), '
+                               'nothing sent.' % (ipaddr, record['params']))
+            elif not record['error']:
                 if echo_output:
-                    print(received)
-                print('Programming ' + ipaddr + ' succeeded.')
+                    progress.print(record['response'])
+                if args.idempotent:
+                    nr_changed += 1
+                    nr_params += record['changed']
+                    progress.print('Programming %s succeeded (%d of %d '
+                                   'params changed).'
+                                   % (ipaddr, record['changed'],
+                                      record['params']))
+                else:
+                    progress.print('Programming ' + ipaddr + ' succeeded.')
             else:
-                print('ERROR: Programming ' + ipaddr + ' failed.')
-            print('')
-        os.remove('commands.tmp')
-print("Done.")
+                progress.print(record['error'] + ' ERROR: Programming ' +
+                               ipaddr + ' failed.')
+            progress.print('')
+    progress.close()
+    if args.idempotent and not args.verify:
+        print("%d camera's changed (%d params), %d already up to date."
+              % (nr_changed, nr_params, nr_unchanged))
+    print("Done.")
+
+
+if __name__ == '__main__':
+    main()
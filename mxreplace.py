@@ -0,0 +1,251 @@
+# ****************************************************************************
+# * mxreplace.py
+# * Generate camera configs from a template config and smartsensor.csv
+#
+# The reverse of mxtract.py: for every row of smartsensor.csv (made by
+# mxtract.py) the camera dependant settings found by mxtract (HOSTNAME,
+# IPADDR, ahN_arming, activity_area_VMn, profile states etc.) are put into
+# a copy of the template config. The results are saved as
+# <IPaddress>_<datetime>.cfg in the current directory (or the -o directory)
+# where mxrestore.py picks them up directly: they are newer than the
+# backups of the camera's, so they are the ones restored. Existing files
+# are never overwritten: a row whose config would replace an existing file
+# (or one generated earlier in the run) is reported instead.
+# The template is compiled once: every line that holds a camera dependant
+# setting is found in advance, so generating a config only touches those
+# lines. The configs are generated in parallel.
+#
+# usage:
+# python mxreplace.py [options]
+# use option -h or --help for instructions
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import os
+import sys
+import argparse
+import time
+import datetime
+import csv
+import multiprocessing
+import concurrent.futures
+import mxcfg
+from mxtract import replace_substring
+
+
+RELEASE = '1.0 - 19-10-2026'
+SSDFILE = 'smartsensor.csv'
+OUTDIR = '.'
+
+# (field, text the line must contain, key in front of the value)
+# a field ending in profilestate_<name> switches the profile on or off
+# marker None means the line must start with the key
+RULES = ([("HOSTNAME", None, "HOSTNAME="),
+          ("IPADDR", None, "IPADDR=")] +
+         [("ah%d_arming" % (n), "ah%d_arming=" % (n), "ah%d_arming=" % (n))
+          for n in range(1, 21)] +
+         [("MICRO", "MICRO=", "MICRO="),
+          ("SPEAKER", "MICRO=", "SPEAKER="),
+          ("SPEAKERLEVEL", "SPEAKERLEVEL=", "SPEAKERLEVEL="),
+          ("VOIPVOIP", "VOIPVOIP=", "VOIPVOIP="),
+          ("userid", ":userid=", ":userid="),
+          ("authid", ":authid=", ":authid="),
+          ("authpwd", "authpwd=", "authpwd="),
+          ("motion_area", "motion_area=", "motion_area=")])
+for n in range(1, 6):
+    RULES += [("activity_area_VM%d" % (n), "ima=VM%d:" % (n), ":activity_area="),
+              ("profilestate_VM%d" % (n), "ima=VM%d:" % (n), None),
+              ("activity_directions_VM%d" % (n), "ima=VM%d:" % (n),
+               "activity_directions="),
+              ("vm_list_VM%d" % (n), "ima=VM%d:" % (n), "vm_list=")]
+RULES += [("profilestate_Virtuele_Ronde", "msg=Virtuele_Ronde:", None),
+          ("profilestate_MI", "env=MI:", None),
+          ("MI_lvl", "env=MI:", "mi_lvl="),
+          ("profilestate_Logo_On", "msg=Logo_On:", None),
+          ("profilestate_Logo_Off", "msg=Logo_Off:", None)]
+RULES += [("profilestate_Bell%d" % (n), "met=Bell%d:" % (n), None)
+          for n in range(1, 6)]
+
+template = None  # compiled template of this (worker) process
+
+
+def compile_template(lines):
+    # list of (line, [(field, key), ...]) with the rules matching each line
+    compiled = []
+    for line in lines:
+        rules = []
+        for (field, marker, key) in RULES:
+            if marker is None:
+                if line.startswith(key):
+                    rules.append((field, key))
+            elif marker in line:
+                if key is None or key in line:
+                    rules.append((field, key))
+        compiled.append((line, rules))
+    return compiled
+
+
+def set_profilestate(line, state):
+    # switches a profile line on (active) or off (inactive)
+    if state == 'inactive' and '_profilestate=i' not in line:
+        if '_profilestate=' in line:
+            return replace_substring(line, '_profilestate=', ':', 'i')
+        return line.rstrip('\n') + ':_profilestate=i\n'
+    if state == 'active' and '_profilestate=i' in line:
+        return replace_substring(line, '_profilestate=', ':', '')
+    return line
+
+
+def render(ssd):
+    # the template with the fields of one row of smartsensor.csv
+    out = []
+    for (line, rules) in template:
+        for (field, key) in rules:
+            value = ssd.get(field)
+            if not value or (field == 'IPADDR' and value == 'DHCP'):
+                continue
+            if key is None:
+                line = set_profilestate(line, value)
+            else:
+                line = replace_substring(line, key, ':', value)
+        out.append(line)
+    return ''.join(out)
+
+
+def output_filename(ssd, outdir, stamp):
+    # same IP/name part as the backup the row was extracted from
+    name = os.path.basename(ssd['file']).split('_')[0]
+    return os.path.join(outdir, name + '_' + stamp + '.cfg')
+
+
+def generate(job):
+    # renders and writes the config of one row, returns (filename, error)
+    # duplicate is set when an earlier row of the run got the same filename
+    (ssd, filename, duplicate) = job
+    if duplicate:
+        return filename, ('(row of %s) has the same name as an earlier row'
+                          % (ssd['file']))
+    try:
+        with open(filename, 'x') as outfile:
+            outfile.write(render(ssd))
+    except FileExistsError:
+        return filename, '(row of %s) the file already exists' % (ssd['file'])
+    except IOError as e:
+        return filename, str(e)
+    return filename, ''
+
+
+def init_worker(compiled):
+    global template
+    template = compiled
+
+
+def read_template(templatefile):
+    with mxcfg.CfgFile(templatefile) as cfg:
+        return compile_template(cfg.lines())
+
+
+def generate_all(templatefile, ssdfile=SSDFILE, outdir=OUTDIR, workers=None,
+                 stamp=None):
+    # generates the configs of all rows of ssdfile
+    # yields (filename, error) for every generated config
+    compiled = read_template(templatefile)
+    if stamp is None:
+        stamp = datetime.datetime.now().strftime("%y%m%d-%H%M")
+    os.makedirs(outdir, exist_ok=True)
+    jobs = []
+    written = set()
+    with open(ssdfile, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            if not row.get('file'):
+                continue
+            filename = output_filename(row, outdir, stamp)
+            jobs.append((row, filename, filename in written))
+            written.add(filename)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker,
+            initargs=(compiled,)) as pool:
+        for result in pool.map(generate, jobs, chunksize=16):
+            yield result
+
+
+def main(argv=None):
+    start = time.time()
+
+    print('mxreplace ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-t", "--template", nargs=1, help="\
+                        specify template cfg file")
+    parser.add_argument("-i", "--input", nargs=1, help="\
+                        specify CSV made by mxtract (default smartsensor.csv)")
+    parser.add_argument("-o", "--outdir", nargs=1, help="\
+                        specify directory for the generated configs \
+                        (default current directory)")
+    parser.add_argument("-w", "--workers", nargs=1, help="\
+                        specify number of configs generated at the same time \
+                        (default number of CPU's)")
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if args.template is None:
+        print("The program requires a template cfg file! (-t [file])")
+        sys.exit()
+
+    if not os.path.exists(args.template[0]):
+        print("The template '%s' does not exist!" % (args.template[0]))
+        sys.exit()
+
+    if args.input:
+        ssdfile = args.input[0]
+    else:
+        ssdfile = SSDFILE
+    if not os.path.exists(ssdfile):
+        print("The input '%s' does not exist! Run mxtract.py first."
+              % (ssdfile))
+        sys.exit()
+
+    if args.outdir:
+        outdir = args.outdir[0]
+    else:
+        outdir = OUTDIR
+
+    workers = None
+    if args.workers:
+        try:
+            workers = int(args.workers[0])
+        except ValueError:
+            print("Unable to understand workers value of " + args.workers[0])
+            print("Try an interger")
+            sys.exit()
+
+    print('Generating configs from ' + args.template[0] + ' and ' + ssdfile)
+
+    nr_of_files = 0
+    nr_of_errors = 0
+    for (filename, error) in generate_all(args.template[0], ssdfile, outdir,
+                                          workers):
+        if error:
+            print("ERROR: Unable to write", filename, error)
+            nr_of_errors += 1
+        else:
+            print("Generated: ", filename)
+            nr_of_files += 1
+
+    print("")
+    end = time.time()
+    exectime = round(1000*(end-start))
+    print("Generated ", nr_of_files, " files (", nr_of_errors, " errors) in ",
+          exectime, " milliseconds.")
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main()
@@ -10,6 +10,9 @@
 # use option -h or --help for instructions
 # See https://github.com/keptenkurk/mxpgm/blob/master/README.md for
 # instructions
+# The restore can also be used from other python code:
+#   import mxrestore
+#   record = mxrestore.restore_device('192.168.1.24', 'admin', 'meinsm')
 #
 # release info
 # 1.0 first release 29/8/17 Paul Merkx
@@ -17,268 +20,362 @@
 # to Python3
 # 1.2 skipped version
 # 1.3 Changed PyCurl to requests
+# 1.4 restore available as importable function, config streamed from disk,
+#     camera's rebooted with -r are polled in the background until they
+#     are back
 # ****************************************************************************
 import os
 import sys
 import argparse
-import csv
-import datetime
-import time
 import glob
-import math
-import io
-import requests
-from http import HTTPStatus
-
-RELEASE = '1.3 - 1-6-2020'
-TMPCONFIG = 'config.tmp'
-TMPCONFIG2 = 'config2.tmp'
+import threading
+import time
+import mxcfg
+import mxnet
+
+RELEASE = '1.4 - 19-10-2026'
 TIMEOUT = 120  # Timeout can be overwritten with -t parameter
-# Ignore the warning that SSL CA will not be checked
-requests.packages.urllib3.disable_warnings(requests.packages.urllib3.
-                                           exceptions.InsecureRequestWarning)
+DEADLINE = 600  # seconds a rebooted camera gets to come back (-r option)
+READY_FIRST = 10  # seconds before the first poll of a rebooted camera
+READY_MAX = 30  # maximum seconds between two polls (doubled after each poll)
+READY_UP = 90  # a camera answering this long after its reboot is back even
+               # when no poll saw it down
+READY_TIMEOUT = 3  # timeout of a single poll
+READYFILE = 'ready.csv'
+READY_FIELDS = ['IP', 'ready', 'ready_s', 'polls']
 
 
-def filewritable(filename):
-    try:
-        f = open(filename, 'w')
-        f.close()
-    except IOError:
-        print('Unable to write to ' + filename + '. It might be open ' \
-              'in another application.')
-        return False
-    os.remove(filename)
-    return True
+def latest_backup(ipaddr):
+    # most recent backup file of a device in the current directory or None
+    cfgfilenamepattern = ipaddr.replace(".", "-") + "_*.cfg"
+    list_of_files = glob.glob(cfgfilenamepattern)
+    if len(list_of_files) == 0:
+        return None
+    return max(list_of_files, key=os.path.getctime)
 
 
-def validate_ip(s):
-    a = s.split('.')
-    if len(a) != 4:
-        return False
-    for x in a:
-        if not x.isdigit():
-            return False
-        i = int(x)
-        if i < 0 or i > 255:
+def device_version(session, ipaddr, use_ssl=False, timeout=TIMEOUT,
+                   cache=None, ttl=mxnet.TIMESTAMP_TTL):
+    # SW version of the camera from its timestamp section, or from the
+    # census cache when it holds a fresh answer for the camera
+    # returns (True, version) or (False, reason of failure)
+    (result, entry, cached) = mxnet.lookup_timestamp(session, ipaddr, use_ssl,
+                                                     timeout, cache, ttl)
+    if not result:
+        return False, entry
+    return True, entry.get('VERSION', '')
+
+
+def restore_commands(cfgfile, reboot=False):
+    # API commandfile writing the entire config of cfgfile, the config is
+    # streamed from disk while it is sent
+    postamble = 'store\nupdate\n'
+    if reboot:
+        postamble += 'reboot\n'
+    return mxnet.FilePayload('\nhelo\nwrite\n', cfgfile, postamble + 'quit\n\n')
+
+
+def restore_device(ipaddr, username, password, use_ssl=False,
+                   override=False, reboot=False, timeout=TIMEOUT,
+                   session=None, cache=None, ttl=mxnet.TIMESTAMP_TTL):
+    # restores the most recent backup of a device when its SW version
+    # matches the one of the camera (or override is set)
+    # cache is a timestamp cache (see mxnet.py) used for the SW version
+    # returns a record with the IP, the restored file, both versions and
+    # an error ('' when the restore succeeded)
+    if session is None:
+        with mxnet.new_session(username, password) as session:
+            return restore_device(ipaddr, username, password, use_ssl,
+                                  override, reboot, timeout, session, cache,
+                                  ttl)
+    record = {'IP': ipaddr, 'file': '', 'cfgversion': '',
+              'deviceversion': '', 'versionok': False, 'error': ''}
+    latest_file = latest_backup(ipaddr)
+    if latest_file is None:
+        record['error'] = 'No configfile found for device ' + ipaddr
+        return record
+    record['file'] = latest_file
+    record['cfgversion'] = mxcfg.read_version(latest_file)
+    (result, deviceversion) = device_version(session, ipaddr, use_ssl,
+                                             timeout, cache, ttl)
+    if not result:
+        record['error'] = deviceversion + ' Unable to verify device SW version'
+        return record
+    record['deviceversion'] = deviceversion
+    record['versionok'] = deviceversion == record['cfgversion']
+    if not (record['versionok'] or override):
+        record['error'] = 'SW version does not match configfile version ' \
+                          'for device ' + ipaddr
+        return record
+    (result, received) = mxnet.transfer(session, ipaddr, use_ssl,
+                                        restore_commands(latest_file, reboot),
+                                        timeout)
+    if not result:
+        record['error'] = received + ' ERROR: Restoring of ' + ipaddr + \
+            ' failed.'
+    if cache is not None:
+        cache.pop(ipaddr, None)  # the restore changed the config date
+    return record
+
+
+class ReadyPoller(mxnet.Scheduler):
+    # Polls rebooted camera's in the background until they answer again,
+    # while the main thread continues restoring other camera's. Every camera
+    # is polled with a cheap request of its start page (any HTTP answer,
+    # even 401, means its webserver is back) with a doubling interval, a
+    # few workers poll all camera's at the same time.
+    # A camera is back when it answers after a poll found it down (or after
+    # READY_UP seconds or the deadline if that is shorter, for reboots
+    # faster than the first poll). Camera's
+    # not back within deadline seconds are reported as not ready.
+    # report(record) is called from the polling thread for every finished
+    # camera.
+    def __init__(self, session, use_ssl=False, deadline=DEADLINE,
+                 workers=mxnet.WORKERS, report=None):
+        super().__init__(workers)
+        self.session = session
+        self.use_ssl = use_ssl
+        self.deadline = deadline
+        self.report = report
+        self.cond = threading.Condition()  # guards pending and results
+        self.pending = 0
+        self.stopped = False
+        self.results = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def add(self, ipaddr):
+        # starts polling a camera that was just told to reboot
+        camera = {'IP': ipaddr, 'start': time.time(), 'delay': READY_FIRST,
+                  'polls': 0, 'down': False}
+        with self.cond:
+            self.pending += 1
+        self.schedule(time.time() + camera['delay'], camera)
+
+    def run(self):
+        while not self.stopped:
+            self.step()
+
+    def work(self, camera):
+        # True when the camera answers
+        try:
+            r = self.session.get(mxnet.base_url(camera['IP'], self.use_ssl) +
+                                 '/', timeout=READY_TIMEOUT)
+            return r.status_code < 500
+        except Exception:
             return False
-    return True
 
+    def failure(self, camera, error):
+        return False
 
-def transfer(ipaddr, username, password, commandfile):
-    # transfers commandfile to camera
-    if use_ssl:
-        url = 'https://' + ipaddr + '/admin/remoteconfig'
-    else:
-        url = 'http://' + ipaddr + '/admin/remoteconfig'
-    try:
-        with open(commandfile, 'rb') as payload:
-            headers = {'content-type': 'application/x-www-form-urlencoded'}
-            response = requests.post(url, auth=(username, password),
-                                     data=payload, verify=False,
-                                     headers=headers, timeout=TIMEOUT)
-    except requests.ConnectionError:
-        print('Unable to connect. ', end='')
-        return False, ''
-    except requests.Timeout:
-        print('Timeout. ', end='')
-        return False, ''
-    except requests.exceptions.RequestException as e:
-        print('Uncaught error:', str(e), end='')
-        return False, ''
-    else:
-        content = response.text
-        if response:
-            if (content.find('#read::') != 0):
-                print('Are you sure this is Mobotix? ', end='')
-                return False, ''
-            else:
-                return True, content
+    def done(self, camera, up):
+        camera['polls'] += 1
+        elapsed = time.time() - camera['start']
+        if up and (camera['down'] or
+                   elapsed >= min(READY_UP, self.deadline)):
+            self.ready(camera, True, elapsed)
+        elif elapsed >= self.deadline:
+            self.ready(camera, False, elapsed)
         else:
-            print('HTTP response code: ',
-                  HTTPStatus(response.status_code).phrase)
-            return False, ''
-
-
-def verify_version(cfgfileversion, deviceIP, username, password):
-    # check if cfg to be restored has same SW version as device
-    versionok = False
-    result = False
-    if filewritable(TMPCONFIG2):
-        outfile = open(TMPCONFIG2, 'w')
-        outfile.write('\n')
-        outfile.write('helo\n')
-        outfile.write('view section timestamp\n')
-        outfile.write('quit\n')
-        outfile.write('\n')
-        outfile.close()
-        (result, received) = transfer(ipaddr, username, password, TMPCONFIG2)
-        if result:
-            versionpos = received.find('VERSION=')
-            datepos = received.find('DATE=')
-            deviceversion = received[versionpos+8:datepos-1]
-            # print('[' + deviceversion + '] - [' + cfgfileversion + ']')
-            if deviceversion == cfgfileversion:
-                versionok = True
-            else:
-                versionok = False
-        os.remove(TMPCONFIG2)
-    else:
-        print('ERROR: Unable to write temporary file')
+            camera['down'] = camera['down'] or not up
+            camera['delay'] = min(2 * camera['delay'], READY_MAX,
+                                  max(1, self.deadline - elapsed))
+            self.schedule(time.time() + camera['delay'], camera)
+
+    def ready(self, camera, ready, elapsed):
+        record = {'IP': camera['IP'], 'ready': ready,
+                  'ready_s': round(elapsed) if ready else '',
+                  'polls': camera['polls']}
+        if self.report:
+            self.report(record)
+        with self.cond:
+            self.results.append(record)
+            self.pending -= 1
+            self.cond.notify_all()
+
+    def wait(self):
+        # waits until all camera's are back or past their deadline
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+        self.stopped = True
+        self.thread.join()
+        self.close()
+        return self.results
+
+
+def main(argv=None):
+    print('MxRestore ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Restores entire configuration of multiple ' \
+          'Mobotix camera\'s from disk.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--deviceIP", nargs=1,
+                        help="specify target device IP when \
+                        programming a single camera")
+    parser.add_argument("-l", "--devicelist", nargs=1,
+                        help="specify target device list in CSV when \
+                        programming multiple camera's")
+    parser.add_argument("-u", "--username", nargs=1,
+                        help="specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1,
+                        help="specify target device admin password")
+    parser.add_argument("-o", "--override",
+                        help="write config even if SW versions are unequal",
+                        action="store_true")
+    parser.add_argument("-r", "--reboot",
+                        help="reboots camera after restoring",
+                        action="store_true")
+    parser.add_argument("-s", "--ssl",
+                        help="use SSL to communicate (HTTPS)",
+                        action="store_true")
+    parser.add_argument("--ttl", nargs=1,
+                        help="specify seconds a SW version from the census \
+                        cache (mxcensus.cache) is used, 0 asks every camera \
+                        (default = 3600)")
+    parser.add_argument("--deadline", nargs=1,
+                        help="specify seconds a camera gets to come back \
+                        after its reboot (-r) before it is reported \
+                        (default = 600)")
+    mxnet.add_shard_argument(parser)
+    mxnet.add_progress_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if (args.deviceIP is None and args.devicelist is None) or \
+       (args.deviceIP and args.devicelist):
+        print("Either deviceIP or devicelist is required")
         sys.exit()
-    return result, versionok
-
-
-# ***************************************************************
-# *** Main program ***
-# ***************************************************************
-print('MxRestore ' + RELEASE + ' by (c) Simac Healthcare.')
-print('Restores entire configuration of multiple ' \
-      'Mobotix camera\'s from disk.')
-print('Disclaimer: ')
-print('USE THIS SOFTWARE AT YOUR OWN RISK')
-print(' ')
-
-# *** Read arguments passed on commandline
-parser = argparse.ArgumentParser()
-parser.add_argument("-d", "--deviceIP", nargs=1,
-                    help="specify target device IP when \
-                    programming a single camera")
-parser.add_argument("-l", "--devicelist", nargs=1,
-                    help="specify target device list in CSV when \
-                    programming multiple camera's")
-parser.add_argument("-u", "--username", nargs=1,
-                    help="specify target device admin username")
-parser.add_argument("-p", "--password", nargs=1,
-                    help="specify target device admin password")
-parser.add_argument("-o", "--override",
-                    help="write config even if SW versions are unequal",
-                    action="store_true")
-parser.add_argument("-r", "--reboot",
-                    help="reboots camera after restoring",
-                    action="store_true")
-parser.add_argument("-s", "--ssl",
-                    help="use SSL to communicate (HTTPS)",
-                    action="store_true")
-
-args = parser.parse_args()
-
-# *** Check validity of the arguments
-if (args.deviceIP is None and args.devicelist is None) or \
-   (args.deviceIP and args.devicelist):
-    print("Either deviceIP or devicelist is required")
-    sys.exit()
-
-if args.username is None:
-    print("Default Admin account assumed")
-    username = 'admin'
-else:
-    username = args.username[0]
-
-if args.password is None:
-    print("Default Admin password assumed")
-    password = 'meinsm'
-else:
-    password = args.password[0]
-
-if not args.deviceIP and not args.devicelist:
-    print('No devices specified. Either specify a device (-d)' \
-          'or devicelist (-l)')
-    sys.exit()
-
-if args.deviceIP:
-    if not validate_ip(args.deviceIP[0]):
-        print("Warning: The device %s is not a valid IPv4 address!"
-              % (args.deviceIP[0]))
-        print("Continuing using %s as devicename."
-              % (args.deviceIP[0]))
-
-if args.devicelist:
-    if not os.path.exists(args.devicelist[0]):
-        print("The devicelist '%s' does not exist in the current directory!"
-              % (args.devicelist[0]))
+
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
+    else:
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    if args.deviceIP:
+        if not mxnet.validate_ip(args.deviceIP[0]):
+            print("Warning: The device %s is not a valid IPv4 address!"
+                  % (args.deviceIP[0]))
+            print("Continuing using %s as devicename."
+                  % (args.deviceIP[0]))
+
+    if args.devicelist:
+        if not os.path.exists(args.devicelist[0]):
+            print("The devicelist '%s' does not exist in the current directory!"
+                  % (args.devicelist[0]))
+            sys.exit()
+
+    use_ssl = bool(args.ssl)
+
+    try:
+        ttl = mxnet.TIMESTAMP_TTL
+        if args.ttl:
+            ttl = int(args.ttl[0])
+        deadline = DEADLINE
+        if args.deadline:
+            deadline = int(args.deadline[0])
+    except ValueError:
+        print("Unable to understand ttl or deadline value")
+        print("Try an interger")
         sys.exit()
+    shard = mxnet.shard_from_args(args)
+    cachefile = mxnet.shard_filename(mxnet.TIMESTAMP_CACHE, shard)
+    cache = mxnet.read_cache(cachefile)
+
+    print('Starting')
+
+    if args.devicelist:
+        print('Build devicelist...')
+    else:
+        print('Found device ' + args.deviceIP[0])
+    devicelist = mxnet.read_devicelist(args.devicelist and args.devicelist[0],
+                                       args.deviceIP and args.deviceIP[0])
 
-if args.ssl:
-    use_ssl = True
-else:
-    use_ssl = False
-
-print('Starting')
-
-# Build devicelist from devicelist file or from single parameter
-# devicelist is a list of lists
-devicelist = []
-if args.devicelist:
-    print('Build devicelist...')
-    csv.register_dialect('semicolons', delimiter=';')
-    with open(args.devicelist[0], 'r') as f:
-        reader = csv.reader(f, dialect='semicolons')
-        for row in reader:
-            devicelist.append(row)
-else:
-    print('Found device ' + args.deviceIP[0])
-    devicelist.append(['IP'])
-    devicelist.append([args.deviceIP[0]])
-
-for devicenr in range(1, len(devicelist)):
-    # skip device if starts with comment
-    if devicelist[devicenr][0][0] != '#':
-        result = False
-        ipaddr = devicelist[devicenr][0]
-        cfgfilenamepattern = ipaddr.replace(".", "-") + "_*.cfg"
-        list_of_files = glob.glob(cfgfilenamepattern)
-        if len(list_of_files) > 0:
-            latest_file = max(list_of_files, key=os.path.getctime)
-            cfgfile = open(latest_file, 'r')
-            cfgfileversion = ''
-            for line in cfgfile.readlines():
-                if line.find('#:MX-') == 0:
-                    cfgfileversion = line[2:-1]
-                    break
-            (result, versionok) = verify_version(cfgfileversion, ipaddr,
-                                                 username, password)
-            if result:
-                if versionok:
-                    print('SW version matches configfile version ' \
-                          'for device ' + ipaddr)
-                else:
-                    if args.override:
-                        print('Non matching SW versions overridden by ' \
-                              '--override flag for device ' + ipaddr)
-                if versionok or args.override:
-                    # build API commandfile to read the config
-                    if filewritable(TMPCONFIG):
-                        outfile = open(TMPCONFIG, 'w')
-                        outfile.write('\n')
-                        outfile.write('helo\n')
-                        outfile.write('write\n')
-                        cfgfile = open(latest_file, 'r')
-                        for line in cfgfile:
-                            outfile.write(line)
-                        outfile.write('store\n')
-                        outfile.write('update\n')
-                        if args.reboot:
-                            outfile.write('reboot\n')
-                        outfile.write('quit\n')
-                        outfile.write('\n')
-                        outfile.close()
-                        print('Restoring ' + ipaddr + '...(takes abt 90sec)..')
-                        (result, received) = transfer(ipaddr, username,
-                                                      password, TMPCONFIG)
-                        if result:
-                            print('Restoring of ' + latest_file + ' to ' +
-                                  ipaddr + ' succeeded.')
-                        else:
-                            print('ERROR: Restoring of ' + ipaddr + ' failed.')
-                        os.remove(TMPCONFIG)
-                else:
-                    print('SW version does not match configfile version ' \
-                          'for device ' + ipaddr)
-                    print('Use -o or --override flag to ignore difference ' \
-                          '(but be aware of unexpected camera behaviour)')
+    rows = list(mxnet.devices(devicelist, shard))
+    (rows, unresolved) = mxnet.resolve_devices(rows)
+    progress = mxnet.Progress(len(rows) + len(unresolved), 1, args.progress)
+
+    def restore(row):
+        return restore_device(row[0], username, password, use_ssl,
+                              args.override, args.reboot, cache=cache,
+                              ttl=ttl)
+
+    restore = progress.track(restore)
+
+    # rebooted camera's are polled in the background until they are back
+    poller = None
+    if args.reboot:
+        def report(record):
+            if record['ready']:
+                progress.print('Device %s is back after %d seconds.'
+                               % (record['IP'], record['ready_s']))
             else:
-                print('Unable to verify device SW version')
+                progress.print('WARNING: Device %s is not back within %d '
+                               'seconds!' % (record['IP'], deadline))
+        poller = ReadyPoller(mxnet.new_session(username, password,
+                                               pool=mxnet.WORKERS),
+                             use_ssl, deadline, report=report)
+        poller.start()
+    for (row, error) in unresolved:
+        progress.finished(True)
+        progress.print(error + ' ERROR: Restoring ' + row[0] + ' failed.')
+        progress.print('')
+    for row in rows:
+        ipaddr = row[0]
+        progress.print('Restoring ' + ipaddr + '...(takes abt 90sec)..')
+        record = restore(row)
+        progress.finished(bool(record['error']))
+        if record['versionok']:
+            progress.print('SW version matches configfile version ' \
+                           'for device ' + ipaddr)
+        elif record['deviceversion'] and args.override:
+            progress.print('Non matching SW versions overridden by ' \
+                           '--override flag for device ' + ipaddr)
+        if record['error']:
+            progress.print(record['error'])
+            if record['deviceversion'] and not args.override and \
+               not record['versionok']:
+                progress.print('Use -o or --override flag to ignore ' \
+                               'difference (but be aware of unexpected ' \
+                               'camera behaviour)')
         else:
-            print('No configfile found for device ' + ipaddr)
-        print('')
-print("Done.")
+            progress.print('Restoring of ' + record['file'] + ' to ' +
+                           ipaddr + ' succeeded.')
+            if poller:
+                poller.add(ipaddr)
+        progress.print('')
+    progress.close()
+
+    if poller:
+        print("Waiting for %d rebooted camera's to come back..."
+              % (poller.pending))
+        results = poller.wait()
+        poller.session.close()
+        readyfile = mxnet.shard_filename(READYFILE, shard)
+        with mxnet.ResultWriter(readyfile, READY_FIELDS) as writer:
+            for record in results:
+                writer.write(record)
+        notready = [r['IP'] for r in results if not r['ready']]
+        print("%d camera's back, %d not back within %d seconds (see %s)."
+              % (len(results) - len(notready), len(notready), deadline,
+                 readyfile))
+    mxnet.write_cache(cachefile, cache)
+    print("Done.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+# ****************************************************************************
+# * mxsnap.py
+# * Mobotix live image checker
+#
+# This script fetches the current image of (multiple) mobotix camera's at
+# the same time to verify they actually produce images, like after a mass
+# restore or reprogramming. Images are streamed to disk or only their size
+# and hash are recorded. Camera's that fail, return a (nearly) black image
+# or return the same image as the previous run (stale) are reported.
+# usage:
+# python mxsnap.py [options]
+# use option -h or --help for instructions
+# Images can also be checked from other python code:
+#   import mxsnap
+#   record = mxsnap.fetch_snapshot('192.168.1.24', 'admin', 'meinsm')
+#
+# release info
+# 1.0 first release 19-10-2026
+# ****************************************************************************
+import os
+import sys
+import argparse
+import hashlib
+import time
+import mxnet
+
+RELEASE = '1.0 - 19-10-2026'
+TIMEOUT = 5   # requests timeout
+SNAPSHOT = '/record/current.jpg'
+MINSIZE = 8000  # images smaller than this (bytes) are considered black
+STATEFILE = 'mxsnap.state'
+OUTFILE = 'snapshots.csv'
+FIELDNAMES = ['IP', 'status', 'bytes', 'latency_ms', 'total_ms', 'sha1',
+              'flags', 'file', 'error']
+
+
+def fetch_snapshot(ipaddr, username, password, use_ssl=False,
+                   timeout=TIMEOUT, session=None, savedir=None,
+                   minsize=MINSIZE, previous=None):
+    # fetches the current image of a camera and streams it through a hash
+    # (and into <savedir>/<IP>.jpg when savedir is given)
+    # latency_ms is the time until the response started, total_ms the time
+    # until the whole image was received. flags holds 'black' for images
+    # smaller than minsize and 'stale' when the hash equals previous.
+    # returns a record with the IP, the results and an error ('' when an
+    # image was received)
+    import requests
+    if session is None:
+        with mxnet.new_session(username, password) as session:
+            return fetch_snapshot(ipaddr, username, password, use_ssl,
+                                  timeout, session, savedir, minsize, previous)
+    record = {'IP': ipaddr, 'status': '', 'bytes': 0, 'latency_ms': '',
+              'total_ms': '', 'sha1': '', 'flags': '', 'file': '', 'error': ''}
+    sha1 = hashlib.sha1()
+    outfile = None
+    start = time.time()
+    try:
+        with session.get(mxnet.base_url(ipaddr, use_ssl) + SNAPSHOT,
+                         timeout=timeout, stream=True) as r:
+            record['status'] = r.status_code
+            record['latency_ms'] = round(1000 * (time.time() - start))
+            r.raise_for_status()
+            if savedir:
+                record['file'] = os.path.join(savedir, ipaddr.replace('.', '-')
+                                              + '.jpg')
+                outfile = open(record['file'], 'wb')
+            for chunk in r.iter_content(mxnet.CHUNKSIZE):
+                if record['bytes'] == 0 and not chunk.startswith(b'\xff\xd8'):
+                    record['error'] = 'Response is not a JPEG image'
+                    break
+                record['bytes'] += len(chunk)
+                sha1.update(chunk)
+                if outfile:
+                    outfile.write(chunk)
+    except requests.exceptions.HTTPError as errh:
+        record['error'] = "Http Error: " + str(errh)
+    except requests.exceptions.ConnectionError as errc:
+        record['error'] = "Error Connecting: " + str(errc)
+    except requests.exceptions.Timeout as errt:
+        record['error'] = "Timeout Error: " + str(errt)
+    except requests.exceptions.RequestException as err:
+        record['error'] = "Something weird happened " + str(err)
+    except IOError as e:
+        record['error'] = "Unable to save image: " + str(e)
+    finally:
+        if outfile:
+            outfile.close()
+    record['total_ms'] = round(1000 * (time.time() - start))
+    if record['error']:
+        if record['file'] and os.path.exists(record['file']):
+            os.remove(record['file'])
+        record['file'] = ''
+        return record
+    if record['bytes'] == 0:
+        record['error'] = 'Empty image'
+        return record
+    record['sha1'] = sha1.hexdigest()
+    flags = []
+    if record['bytes'] < minsize:
+        flags.append('black')
+    if previous and record['sha1'] == previous:
+        flags.append('stale')
+    record['flags'] = ' '.join(flags)
+    return record
+
+
+def main(argv=None):
+    start = time.time()
+
+    print('MxSnap ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--deviceIP", nargs=1, help="specify target device IP when checking a single camera")
+    parser.add_argument("-l", "--devicelist", nargs=1, help="specify target device list in CSV when checking multiple camera's")
+    parser.add_argument("-u", "--username", nargs=1, help="specify target device admin username")
+    parser.add_argument("-p", "--password", nargs=1, help="specify target device admin password")
+    parser.add_argument("-s", "--ssl", help="use SSL to communicate (HTTPS)", action="store_true")
+    parser.add_argument("-t", "--timeout", nargs=1, help="specify timeout in seconds (default = 5)")
+    parser.add_argument("-w", "--workers", nargs=1, help="specify number of camera's handled at the same time (default = 10)")
+    parser.add_argument("-o", "--output", nargs=1, help="write the result of every camera to a .csv or .jsonl file (default = snapshots.csv)")
+    parser.add_argument("-i", "--imagedir", nargs=1, help="save the images in this directory (default = only record size and hash)")
+    parser.add_argument("-m", "--minsize", nargs=1, help="images smaller than this number of bytes are reported as black (default = 8000)")
+    parser.add_argument("-c", "--statefile", nargs=1, help="specify file with the image hashes of the previous run (default = mxsnap.state)")
+    mxnet.add_policy_arguments(parser)
+    mxnet.add_shard_argument(parser)
+    mxnet.add_progress_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if (args.deviceIP is None and args.devicelist is None) or (args.deviceIP and args.devicelist):
+        print("Either deviceIP or devicelist is required")
+        sys.exit()
+
+    if args.username is None:
+        print("Default Admin account assumed")
+        username = 'admin'
+    else:
+        username = args.username[0]
+
+    if args.password is None:
+        print("Default Admin password assumed")
+        password = 'meinsm'
+    else:
+        password = args.password[0]
+
+    try:
+        timeout = TIMEOUT
+        if args.timeout:
+            timeout = int(args.timeout[0])
+        workers = mxnet.WORKERS
+        if args.workers:
+            workers = int(args.workers[0])
+        minsize = MINSIZE
+        if args.minsize:
+            minsize = int(args.minsize[0])
+    except ValueError:
+        print("Unable to understand timeout, workers or minsize value")
+        print("Try an interger")
+        sys.exit()
+
+    if args.deviceIP:
+        if not mxnet.validate_ip(args.deviceIP[0]):
+            print("The device %s is not a valid IPv4 address!" % (args.deviceIP[0]))
+            sys.exit()
+
+    if args.devicelist:
+        if not os.path.exists(args.devicelist[0]):
+            print("The devicelist '%s' does not exist in the current directory!" % (args.devicelist[0]))
+            sys.exit()
+
+    imagedir = None
+    if args.imagedir:
+        imagedir = args.imagedir[0]
+        os.makedirs(imagedir, exist_ok=True)
+
+    statefile = STATEFILE
+    if args.statefile:
+        statefile = args.statefile[0]
+
+    outfilename = OUTFILE
+    if args.output:
+        outfilename = args.output[0]
+
+    shard = mxnet.shard_from_args(args)
+    statefile = mxnet.shard_filename(statefile, shard)
+    outfilename = mxnet.shard_filename(outfilename, shard)
+
+    use_ssl = bool(args.ssl)
+
+    print('Starting')
+    print('Build devicelist...')
+
+    devicelist = mxnet.read_devicelist(args.devicelist and args.devicelist[0],
+                                       args.deviceIP and args.deviceIP[0])
+    policy = mxnet.policy_from_args(args, devicelist[0])
+
+    try:
+        output = mxnet.ResultWriter(outfilename, FIELDNAMES)
+    except IOError:
+        print("Error: Unable to write output file " + outfilename)
+        sys.exit()
+
+    state = mxnet.read_cache(statefile)
+    rows = list(mxnet.devices(devicelist, shard))
+    progress = mxnet.Progress(len(rows), workers, args.progress)
+    session = mxnet.new_session(username, password, pool=workers)
+
+    def fetch(row):
+        return fetch_snapshot(row[0], username, password, use_ssl, timeout,
+                              session, imagedir, minsize, state.get(row[0]))
+
+    counts = {'ok': 0, 'failed': 0, 'black': 0, 'stale': 0}
+    newstate = {}
+    with output, session:
+        for (row, record) in mxnet.run_pool(progress.track(fetch), rows,
+                                            workers, policy):
+            output.write(record)
+            ipaddr = record['IP']
+            progress.finished(bool(record['error']))
+            if record['error']:
+                counts['failed'] += 1
+                progress.print('Device ' + ipaddr + ' ... Fail. ' +
+                               record['error'])
+                continue
+            newstate[ipaddr] = record['sha1']
+            for flag in record['flags'].split():
+                counts[flag] += 1
+            if record['flags']:
+                progress.print('Device ' + ipaddr + ' ... ' +
+                               record['flags'].upper() +
+                               ' image (%d bytes)' % (record['bytes']))
+            else:
+                counts['ok'] += 1
+    progress.close()
+    if policy:
+        policy.close()
+    state.update(newstate)
+    mxnet.write_cache(statefile, state)
+
+    print("")
+    end = time.time()
+    exectime = round(1000*(end-start))
+    print("Checked %d camera's in %d milliseconds: %d OK, %d failed, "
+          "%d black, %d stale." % (len(rows),
+                                  exectime, counts['ok'], counts['failed'],
+                                  counts['black'], counts['stale']))
+    print("Results written to " + outfilename)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,7 @@
 # * mxtract.py
 # * Read a list of Mobotix cfg files and extract the camera dependant parameters
 # * and save them in a CSV file. Field names can be used as label in a template config file
-# * To be used with mxreplace.py which replaces 
+# * To be used with mxreplace.py which replaces the labels in a template config
 #
 # usage:
 # python mxtract.py [options]
@@ -20,8 +20,16 @@
 #     add to csv file
 #     write(target_file)
 #
+# The extraction can also be used from other python code:
+#   import mxtract
+#   mxtract.write_csv(mxtract.extract('.cfg'), 'smartsensor.csv')
+#
 # release info
 # 1.0 first release 27-09-24 Paul Merkx
+# 1.1 extraction available as importable functions, --sqlite output to
+#     a database and -q to query it, CSV rows are written as each file is
+#     extracted with the columns in a fixed order, -r to extract files in
+#     subdirectories and -a to extract files inside zip and tar archives
 # ****************************************************************************
 import os
 import sys
@@ -29,9 +37,14 @@ import argparse
 import time
 import math
 import csv
+import json
+import mxcfg
+import mxnet
 
 
-RELEASE = '1.0 - 27-9-2024'
+RELEASE = '1.1 - 19-10-2026'
+SQLITEFILE = 'smartsensor.db'
+DB_COMMIT = 100  # files upserted in the database between two commits
 
 #----string extraction helper-------
 def extract_substring(input_string, start_char):
@@ -65,6 +78,19 @@ def replace_substring(input_string, start_char, end_char, replacement_string):
     return newstring
 
 
+#---- all fields getSSD can find, in the order of the CSV columns
+SSD_FIELDS = (["file", "HOSTNAME", "IPADDR", "DefaultIP"] +
+              ["ah%d_arming" % (n) for n in range(1, 21)] +
+              ["MICRO", "SPEAKER", "SPEAKERLEVEL",
+               "VOIPVOIP", "userid", "authid", "authpwd", "motion_area"] +
+              [field + "_VM%d" % (n) for n in range(1, 6)
+               for field in ("activity_area", "profilestate",
+                             "activity_directions", "vm_list")] +
+              ["profilestate_Virtuele_Ronde", "profilestate_MI", "MI_lvl",
+               "profilestate_Logo_On", "profilestate_Logo_Off"] +
+              ["profilestate_Bell%d" % (n) for n in range(1, 6)])
+
+
 #---- build dictionairy with sensor specific config items
 def getSSD(lines, cfgfile):
     ssd = {}
@@ -77,8 +103,6 @@ def getSSD(lines, cfgfile):
         sub = extract_substring(line,"IPADDR=")
         if sub!= None:
             ssd["IPADDR"] = sub.replace("\n", "")
-        else:
-            ssd["IPADDR"] = "DHCP"
         sub = extract_substring(line,"Camera IP: ")
         if sub!= None:
             ssd["DefaultIP"] = sub.replace("\n", "")
@@ -333,91 +357,263 @@ def getSSD(lines, cfgfile):
             else:
                 ssd["profilestate_Bell5"] = "active"
 
+    if "IPADDR" not in ssd:
+        ssd["IPADDR"] = "DHCP"
     return ssd
             
 
-def ExtractFile(cfgfile):
-# Changes all sections of templatefile with data from readfile
-    try:
-        with open(cfgfile, 'r') as infile:
-            cfglines = []
-            for line in infile:
-                cfglines.append(line)
-            infile.close()
-    except IOError:
-        print("FATAL: Unable to read", cfgfile)
-        sys.exit()
-    
- # --- Get Sensor Specific Details
-    ssd = getSSD(cfglines, cfgfile)
+def ExtractFile(cfgfile, open_cfg=None):
+# Get Sensor Specific Details of a config file, the lines are read one by one
+# open_cfg opens the CfgFile of an archive member (see mxcfg.walk_cfgfiles)
+# raises IOError when the file can not be read
+    if open_cfg is None:
+        open_cfg = lambda: mxcfg.CfgFile(cfgfile)
+    with open_cfg() as cfg:
+        ssd = getSSD(cfg.lines(), cfgfile)
 
     return ssd
 
-    
-# ***************************************************************
-# *** Main program ***
-# ***************************************************************
-start = time.time()
 
-print('mxtract ' + RELEASE + ' by (c) Simac Healthcare.')
-print('Disclaimer: ')
-print('USE THIS SOFTWARE AT YOUR OWN RISK')
-print(' ')
+def extract(source_ext=".cfg", directory=None, recursive=False,
+            archives=False):
+# Sensor Specific Details of all files in the directory with matching extension
+# (and in its subdirectories and archives) one file at a time
+    for (f, stamp, open_cfg) in mxcfg.walk_cfgfiles(source_ext, directory,
+                                                    recursive, archives):
+        yield ExtractFile(f, open_cfg)
+
 
-# *** Read arguments passed on commandline
-parser = argparse.ArgumentParser()
+def write_csv(all_ssd, filename="smartsensor.csv"):
+# Streams the Sensor Specific Data to a CSV file with the columns in the
+# order of SSD_FIELDS. Fields getSSD does not know of yet are added as extra
+# columns in a second pass over the file. Returns the number of rows written.
+    tmpfilename = filename + '.tmp'
+    extrafilename = filename + '.extra'
+    try:
+        extras = []
+        nr_of_rows = 0
+        with open(tmpfilename, mode='w', newline='') as file, \
+                open(extrafilename, mode='w') as extrafile:
+            # Create a writer object
+            writer = csv.DictWriter(file, fieldnames=SSD_FIELDS,
+                                    extrasaction='ignore')
+            # Write the header (column names)
+            writer.writeheader()
+            # Write the data (rows) as they come in
+            for ssd in all_ssd:
+                writer.writerow(ssd)
+                extra = {key: value for (key, value) in ssd.items()
+                         if key not in SSD_FIELDS}
+                if extra:
+                    extrafile.write(json.dumps([nr_of_rows, extra]) + '\n')
+                    extras.extend(key for key in extra if key not in extras)
+                nr_of_rows += 1
+
+        if extras:
+            with open(tmpfilename, mode='r', newline='') as infile, \
+                    open(extrafilename, mode='r') as extrafile, \
+                    open(filename, mode='w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=SSD_FIELDS + extras)
+                writer.writeheader()
+                extra = json.loads(extrafile.readline())
+                for (rownr, row) in enumerate(csv.DictReader(infile)):
+                    if extra and extra[0] == rownr:
+                        row.update(extra[1])
+                        line = extrafile.readline()
+                        extra = line and json.loads(line)
+                    writer.writerow(row)
+            os.remove(tmpfilename)
+        else:
+            os.replace(tmpfilename, filename)
+    finally:
+        # no temporary files are left behind when the extraction stops
+        for name in (tmpfilename, extrafilename):
+            if os.path.exists(name):
+                os.remove(name)
+    return nr_of_rows
+
+
+def open_db(filename=SQLITEFILE):
+    # opens (or creates) the smartsensor database with one row per file
+    import sqlite3
+    db = sqlite3.connect(filename)
+    if not db_columns(db):
+        db.execute('CREATE TABLE smartsensor ("file" TEXT PRIMARY KEY)')
+        for column in SSD_FIELDS[1:]:
+            add_db_column(db, column)
+    return db
+
+
+def db_columns(db):
+    return [row[1] for row in db.execute('PRAGMA table_info(smartsensor)')]
+
+
+def add_db_column(db, column):
+    # new columns are added when a file has a field not seen before, the
+    # host, IP and profile state columns are indexed for fast queries
+    db.execute('ALTER TABLE smartsensor ADD COLUMN "%s" TEXT' % (column))
+    if column in ('HOSTNAME', 'IPADDR') or column.startswith('profilestate_'):
+        db.execute('CREATE INDEX IF NOT EXISTS "idx_%s" ON smartsensor ("%s")'
+                   % (column, column))
+
+
+def upsert_ssd(db, ssd, columns=None):
+    # inserts or replaces the row of the file of ssd
+    # columns is the list of known table columns, updated when needed
+    if columns is None:
+        columns = db_columns(db)
+    for key in ssd:
+        if key not in columns:
+            add_db_column(db, key)
+            columns.append(key)
+    keys = list(ssd)
+    db.execute('INSERT OR REPLACE INTO smartsensor (%s) VALUES (%s)'
+               % (', '.join('"%s"' % (key) for key in keys),
+                  ', '.join('?' * len(keys))),
+               [ssd[key] for key in keys])
+
+
+def query_db(db, conditions):
+    # rows matching all conditions like ['profilestate_MI=active']
+    # returns (column names, rows)
+    columns = db_columns(db)
+    where = []
+    values = []
+    for condition in conditions:
+        (column, sep, value) = condition.partition('=')
+        if not sep or column not in columns:
+            raise ValueError("Unknown field in '%s'" % (condition))
+        where.append('"%s" = ?' % (column))
+        values.append(value)
+    sql = 'SELECT * FROM smartsensor'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    return columns, db.execute(sql + ' ORDER BY "file"', values).fetchall()
+
+
+def main(argv=None):
+    start = time.time()
+
+    print('mxtract ' + RELEASE + ' by (c) Simac Healthcare.')
+    print('Disclaimer: ')
+    print('USE THIS SOFTWARE AT YOUR OWN RISK')
+    print(' ')
+
+    # *** Read arguments passed on commandline
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-e", "--extension", nargs=1, help="\
+                        specify source extension (default .cfg)")
+    parser.add_argument("-r", "--recursive", help="\
+                        also extract the files in subdirectories",
+                        action="store_true")
+    parser.add_argument("-a", "--archives", help="\
+                        also extract the files inside .zip, .tar and .tar.gz \
+                        archives", action="store_true")
+
+    parser.add_argument("-q", "--query", action="append", help="\
+                        show the rows of the sqlite database matching \
+                        field=value like profilestate_MI=active \
+                        (may be repeated) instead of extracting")
+    parser.add_argument("--sqlite", nargs='?', const=SQLITEFILE, help="\
+                        save to (or query) a sqlite database instead of \
+                        smartsensor.csv (default smartsensor.db)")
+    mxnet.add_shard_argument(parser)
+
+    args = parser.parse_args(argv)
+
+    # *** Check validity of the arguments
+    if args.query:
+        dbfile = args.sqlite or SQLITEFILE
+        if not os.path.exists(dbfile):
+            print("The database '%s' does not exist in the current directory!"
+                  % (dbfile))
+            print("Create it first with --sqlite")
+            sys.exit()
+        db = open_db(dbfile)
+        try:
+            (columns, rows) = query_db(db, args.query)
+        except ValueError as e:
+            print(e)
+            sys.exit()
+        finally:
+            db.close()
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        print("")
+        print(len(rows), " matching files.")
+        return
+
+    if (args.extension) is None:
+        print("Source files extension .cfg is assumed")
+        source_ext = ".cfg"
+    else:
+        print("Only processing ", args.extension[0], " files")
+        source_ext = args.extension[0]
+
+    # a shard handles part of the files and writes a partial output
+    shard = mxnet.shard_from_args(args)
+    csvfile = mxnet.shard_filename("smartsensor.csv", shard)
+    if args.sqlite:
+        args.sqlite = mxnet.shard_filename(args.sqlite, shard)
+
+    print('Start extracting device dependant data from Mobotix config files ')
+
+    if args.sqlite:
+        db = open_db(args.sqlite)
+        columns = db_columns(db)
+
+    def extract_files():
+        #Extract data from all files in the directory with matching extension
+        for (f, stamp, open_cfg) in mxcfg.walk_cfgfiles(
+                source_ext, None, args.recursive, args.archives):
+            if not mxnet.in_shard(f, shard):
+                continue
+            print("Extracting: ", f)
+            try:
+                ssd = ExtractFile(f, open_cfg)
+            except IOError:
+                raise IOError("Unable to read " + f)
+            yield ssd
+
+    # Write Sensor Specific Data to the database or CSV as it is extracted
+    # the database is committed every DB_COMMIT files so a stopped run keeps
+    # the files done so far
+    nr_of_files = 0
+    if args.sqlite:
+        try:
+            for ssd in extract_files():
+                upsert_ssd(db, ssd, columns)
+                nr_of_files += 1
+                if nr_of_files % DB_COMMIT == 0:
+                    db.commit()
+        except IOError as e:
+            print("FATAL: " + str(e))
+            sys.exit()
+        finally:
+            db.commit()
+            db.close()
+        print("")
+        print("Database " + args.sqlite + " updated successfully!")
+    else:
+        try:
+            nr_of_files = write_csv(extract_files(), csvfile)
+        except IOError as e:
+            print("FATAL: " + str(e))
+            sys.exit()
+        print("")
+        if nr_of_files:
+            print("CSV file " + csvfile + " created successfully!")
+        else:
+            os.remove(csvfile)
+            print("No Sensor Specific Data found to be saved.")
 
-parser.add_argument("-e", "--extension", nargs=1, help="\
-                    specify source extension (default .cfg)")
+    print("")
+    end = time.time()
+    exectime = round(1000*(end-start))
+    print("Extracted ", nr_of_files, " files in ", exectime, " milliseconds.")
 
-args = parser.parse_args()
 
-# *** Check validity of the arguments
-    
-if (args.extension) is None:
-    print("Source files extension .cfg is assumed")
-    source_ext = ".cfg"
-else:
-    print("Only processing ", args.extension[0], " files")
-    source_ext = args.extension[0]
-
-print('Start extracting device dependant data from Mobotix config files ')
-
-nr_of_files = 0
-all_ssd = []
-      
-#Extract data from all files in the directory with matching extension      
-files = [f for f in os.listdir(os.getcwd()) if os.path.isfile(os.path.join(os.getcwd(), f))]
-for f in files:
-    # add pathname to file
-    f = os.path.join(os.getcwd(), f)
-    # check proper extension
-    if f.endswith(source_ext):
-        print("Extracting: ", f)
-        all_ssd.append(ExtractFile(f))
-        nr_of_files += 1
-print("")
-
-# Write Sensor Specific Data to CSV if any data found
-if all_ssd:
-    with open("smartsensor.csv", mode='w', newline='') as file:
-        # Get the column names from the whole dictionary
-
-        fieldnames = list({key for row in all_ssd for key in row.keys()})
-        
-        # Create a writer object
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        
-        # Write the header (column names)
-        writer.writeheader()    
-        # Write the data (rows)
-        writer.writerows(all_ssd)
-        print("CSV file smartsensor.csv created successfully!")
-
-else:
-    print("No Sensor Specific Data found to be saved.")
-
-print("")
-end = time.time()
-exectime = round(1000*(end-start))
-print("Extracted ", nr_of_files, " files in ", exectime, " milliseconds.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()